@@ -1,15 +1,26 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import os
-from datetime import datetime
 import logging
-from core.generator import VideoGenerator
+from core.batch import new_task, submit_batch, batch_status, validate_video_options, BATCH_PRIORITY
+from core.cache import get_cache
+from core.clients import close_clients
+from core.job_queue import JobQueue
+from core.file_response import RangeFileResponse
+from core.render import render_pool
+from core.profiles import RENDER_PROFILES, RENDER_PROFILE
+from core.status_hub import StatusHub
+from core.task_store import create_task_store, FINISHED_STATUSES
+from core.worker import Worker, WORKER_CONCURRENCY, WORKER_SHUTDOWN_TIMEOUT
+import re
 import uuid
+import json
 import shutil
+import asyncio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -44,11 +55,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store task status
-tasks = {}
+# Store task status (in memory or in SQLite, see TASK_STORE)
+tasks = create_task_store()
 
-class VideoRequest(BaseModel):
-    topic: str
+# Seconds between evictions of expired finished tasks
+TASK_EVICTION_INTERVAL = int(os.getenv('TASK_EVICTION_INTERVAL', '300'))
+
+# Pushes task status changes to /events subscribers
+status_hub = StatusHub(tasks)
+
+# Jobs are queued here and run by workers (embedded below and/or started with worker.py)
+job_queue = JobQueue()
+
+# Concurrent jobs run by the worker embedded in the API process (0 to rely on worker.py only)
+EMBEDDED_WORKER_CONCURRENCY = int(os.getenv('EMBEDDED_WORKER_CONCURRENCY', str(WORKER_CONCURRENCY)))
+
+class VideoOptions(BaseModel):
     num_images: int = 5
     language: str = "en"
     text_model: int = 0
@@ -56,6 +78,15 @@ class VideoRequest(BaseModel):
     video_length: int = 1
     openai_key: Optional[str] = None
     use_web_search: bool = True  # Nuovo parametro per abilitare/disabilitare la ricerca web
+    prompt_mode: Optional[str] = None  # "sequential", "concurrent" or "batch"; defaults to PROMPT_MODE
+    search_mode: Optional[str] = None  # "agents" or "direct"; defaults to WEB_SEARCH_MODE
+    output_format: Optional[str] = None  # "mp4" or "hls"; defaults to OUTPUT_FORMAT
+    tts_backend: Optional[str] = None  # "gtts", "espeak" or "piper"; defaults to TTS_BACKEND
+    render_profile: Optional[str] = None  # "draft", "standard", "final" or one from RENDER_PROFILES; defaults to RENDER_PROFILE
+    priority: int = 0  # Higher priority jobs leave the queue first
+
+class VideoRequest(VideoOptions):
+    topic: str
 
     class Config:
         use_enum_values = True
@@ -71,89 +102,170 @@ class VideoRequest(BaseModel):
             }
         }
 
+class BatchRequest(VideoOptions):
+    topics: List[str]
+    priority: int = BATCH_PRIORITY  # Below single requests by default
+
 class TaskStatus(BaseModel):
     status: str
     current_step: str = ""
     progress: float = 0
     error: Optional[str] = None
+    stages: Optional[dict] = None
+    queue_position: Optional[int] = None
+    playlist_url: Optional[str] = None
 
-async def generate_video_task(task_id: str, request: VideoRequest):
+def validate_options(request: VideoOptions):
     try:
-        # Create output directory for this task
-        output_dir = os.path.join("output", task_id)
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Initialize video generator with task tracking and optional API key
-        generator = VideoGenerator(
-            task_id=task_id,
-            tasks=tasks,
-            openai_key=request.openai_key
-        )
-
-        # Generate video with the given parameters
-        await generator.generate(
-            topic=request.topic,
-            num_images=request.num_images,
-            language=request.language,
-            text_model=request.text_model,
-            image_model=request.image_model,
-            video_length=request.video_length,
-            output_dir=output_dir,
-            use_web_search=request.use_web_search
-        )
-
-    except Exception as e:
-        logger.error(f"Error in generate_video_task: {str(e)}")
-        tasks[task_id]["status"] = "failed"
-        tasks[task_id]["error"] = str(e)
-        raise
+        validate_video_options(request.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/generate")
-async def generate_video(request: VideoRequest, background_tasks: BackgroundTasks):
-    # Validate number of images
-    if not 1 <= request.num_images <= 10:
-        raise HTTPException(status_code=400, detail="Number of images must be between 1 and 10")
+async def generate_video(request: VideoRequest):
+    validate_options(request)
     
     # Create a new task ID
     task_id = str(uuid.uuid4())
     
-    # Initialize task in the tasks dictionary
-    tasks[task_id] = {
-        "status": "queued",
-        "current_step": "Initializing",
-        "progress": 0,
-        "created_at": datetime.now().isoformat()
-    }
+    # Initialize task in the task store
+    tasks.create(task_id, new_task(request.topic))
     
-    # Add task to background tasks
-    background_tasks.add_task(generate_video_task, task_id, request)
+    # Queue the job for the next free worker (SQLite writes stay off the event loop)
+    await asyncio.to_thread(job_queue.enqueue, task_id, request.dict(), priority=request.priority)
+    queue_position = await asyncio.to_thread(job_queue.position, task_id)
     
-    return {"task_id": task_id, "status": "queued"}
+    return {"task_id": task_id, "status": "queued", "queue_position": queue_position}
 
-@app.get("/status/{task_id}", response_model=TaskStatus)
-async def get_status(task_id: str):
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
+@app.post("/generate/batch")
+async def generate_batch(request: BatchRequest):
+    """Queue one video per topic with shared options; follow them with GET /batch/{batch_id}."""
+    validate_options(request)
     
-    task = tasks[task_id]
+    topics = [topic.strip() for topic in request.topics if topic.strip()]
+    options = request.dict(exclude={"topics", "priority"})
+    try:
+        batch_id, task_ids = await asyncio.to_thread(
+            submit_batch, job_queue, tasks, topics, options, request.priority
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"batch_id": batch_id, "status": "queued", "task_ids": task_ids}
+
+@app.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    status = await asyncio.to_thread(batch_status, job_queue, tasks, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+async def build_task_status(task_id, task):
     status = task.get("status", "queued")
     current_step = task.get("current_step", "")
     progress = task.get("progress", 0)
     error = task.get("error")
+    stages = task.get("stages")
+    # Queue calls run in a thread so a busy SQLite file cannot stall the event loop
+    queue_position = await asyncio.to_thread(job_queue.position, task_id) if status == "queued" else None
     
     return TaskStatus(
         status=status,
         current_step=current_step,
         progress=progress,
-        error=error
+        error=error,
+        stages=stages,
+        queue_position=queue_position,
+        playlist_url=task.get("playlist_url")
+    )
+
+@app.get("/status/{task_id}", response_model=TaskStatus)
+async def get_status(task_id: str):
+    task = tasks.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    return await build_task_status(task_id, task)
+
+@app.get("/events/{task_id}")
+async def stream_status(task_id: str):
+    """Server-Sent Events stream of the task status; ends when the task finishes."""
+    if tasks.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    async def events():
+        async for task in status_hub.watch(task_id):
+            if task is None:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: status\ndata: {json.dumps((await build_task_status(task_id, task)).dict())}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-@app.get("/video/{task_id}")
-async def get_video(task_id: str):
-    if task_id not in tasks:
+@app.get("/tasks")
+async def list_tasks(status: Optional[str] = None, created_after: Optional[str] = None,
+                     created_before: Optional[str] = None, limit: int = 100):
+    return [
+        {
+            "task_id": task_id,
+            "status": task.get("status"),
+            "current_step": task.get("current_step", ""),
+            "progress": task.get("progress", 0),
+            "created_at": task.get("created_at"),
+            "topic": task.get("topic"),
+            "batch_id": task.get("batch_id")
+        }
+        for task_id, task in tasks.list(status=status, created_after=created_after,
+                                        created_before=created_before, limit=limit)
+    ]
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "stages": cache.stats()}
+
+@app.get("/render-profiles")
+async def list_render_profiles():
+    return {
+        "default": RENDER_PROFILE,
+        "profiles": [profile.to_dict() for profile in RENDER_PROFILES.values()]
+    }
+
+@app.post("/cancel/{task_id}")
+async def cancel_task(task_id: str):
+    task = tasks.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    if task.get("status") in FINISHED_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Task already {task['status']}")
+    
+    # A job still in the queue is dropped right away
+    if await asyncio.to_thread(job_queue.cancel, task_id):
+        tasks.update(task_id, {"status": "cancelled", "current_step": "Video generation cancelled"})
+        return {"task_id": task_id, "status": "cancelled"}
+    
+    # A render in progress is stopped right away; otherwise the task stops before rendering.
+    # Workers in other processes pick the request up from the task store.
+    tasks.update(task_id, {"cancel_requested": True})
+    render_pool.cancel(task_id)
+    
+    return {"task_id": task_id, "status": "cancelling"}
+
+@app.api_route("/video/{task_id}", methods=["GET", "HEAD"])
+async def get_video(task_id: str, request: Request, download: bool = False):
+    """Serve the video with byte ranges (for seeking) and caching validators; download=true forces a file download."""
+    task = tasks.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = tasks[task_id]
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="Video generation not completed")
     
@@ -161,7 +273,36 @@ async def get_video(task_id: str):
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="Video file not found")
     
-    return FileResponse(video_path, media_type="video/mp4", filename=f"video_{task_id}.mp4")
+    return RangeFileResponse(
+        video_path,
+        request.headers,
+        media_type="video/mp4",
+        filename=f"video_{task_id}.mp4",
+        inline=not download,
+        method=request.method
+    )
+
+# Files an HLS output directory may contain
+HLS_FILE_PATTERN = re.compile(r"^[\w-]+\.(m3u8|ts)$")
+
+@app.get("/hls/{task_id}/{file_name}")
+async def get_hls_file(task_id: str, file_name: str, request: Request):
+    """Serve the HLS playlist and segments of a task, available while the video is still rendering."""
+    if tasks.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    if not HLS_FILE_PATTERN.match(file_name):
+        raise HTTPException(status_code=400, detail="Invalid HLS file name")
+    
+    file_path = os.path.join("output", task_id, "hls", file_name)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="HLS file not found")
+    
+    if file_name.endswith(".m3u8"):
+        # The playlist grows while segments are encoded: it must not be cached
+        return FileResponse(file_path, media_type="application/vnd.apple.mpegurl",
+                            headers={"Cache-Control": "no-cache"})
+    return RangeFileResponse(file_path, request.headers, media_type="video/mp2t", method=request.method)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -171,6 +312,41 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "An internal server error occurred"}
     )
 
+async def evict_expired_tasks():
+    while True:
+        try:
+            evicted = tasks.evict_expired()
+            if evicted:
+                logger.info(f"Evicted {evicted} expired tasks")
+        except Exception as e:
+            logger.error(f"Error evicting expired tasks: {str(e)}")
+        await asyncio.sleep(TASK_EVICTION_INTERVAL)
+
+@app.on_event("startup")
+async def start_background_services():
+    app.state.eviction_task = asyncio.create_task(evict_expired_tasks())
+    status_hub.start()
+    app.state.worker = None
+    if EMBEDDED_WORKER_CONCURRENCY > 0:
+        app.state.worker = Worker(job_queue, tasks, concurrency=EMBEDDED_WORKER_CONCURRENCY)
+        app.state.worker_task = asyncio.create_task(app.state.worker.run())
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    app.state.eviction_task.cancel()
+    status_hub.stop()
+    if app.state.worker is not None:
+        # Let the running jobs finish; past the timeout they are interrupted and requeued
+        app.state.worker.stop()
+        try:
+            await asyncio.wait_for(asyncio.shield(app.state.worker_task), WORKER_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Running jobs did not finish within {WORKER_SHUTDOWN_TIMEOUT:.0f}s, requeuing them")
+            app.state.worker.abort()
+            await app.state.worker_task
+    render_pool.shutdown()
+    await close_clients()
+
 # Create output directories if they don't exist
 os.makedirs("output", exist_ok=True)
 os.makedirs("static", exist_ok=True)
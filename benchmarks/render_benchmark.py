@@ -0,0 +1,101 @@
+"""
+Compare the ffmpeg slideshow renderer with the moviepy renderer.
+
+Generates synthetic 1024x1024 images and a sine-wave narration track, renders
+the same slideshow (at VIDEO_RESOLUTION) with each renderer in a fresh process
+and reports wall time, peak memory, output size and output duration (which
+should match the narration).
+
+    python benchmarks/render_benchmark.py --images 10 --duration 240 --render-profile draft
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.render import RENDERERS, render_video
+from core.profiles import RENDER_PROFILES, get_render_profile
+from core.slideshow import get_ffmpeg_binary, get_media_duration
+from core.timeline import build_timeline
+
+def make_inputs(work_dir, num_images, duration):
+    """Create num_images noisy PNGs, evenly spread on a timeline, and an MP3 narration stand-in of the given length."""
+    from PIL import Image
+
+    image_paths_with_positions = []
+    for i in range(num_images):
+        image_path = os.path.join(work_dir, f"image_{i}.png")
+        Image.effect_noise((1024, 1024), 64 + i).convert("RGB").save(image_path)
+        image_paths_with_positions.append((image_path, i / num_images))
+
+    audio_path = os.path.join(work_dir, "speech.mp3")
+    subprocess.run(
+        [get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'lavfi',
+         '-i', f"sine=frequency=220:duration={duration}", '-ac', '1', '-ar', '24000', '-b:a', '32k', audio_path],
+        check=True
+    )
+    return build_timeline(image_paths_with_positions, duration=duration), audio_path
+
+def run_renderer(renderer, timeline, audio_path, output_path, profile_name=None):
+    """Render in the current (fresh) process and return timing and peak memory."""
+    start = time.perf_counter()
+    render_video(timeline, audio_path, output_path, renderer=renderer, profile=get_render_profile(profile_name))
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux; ffmpeg runs as a child process
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "renderer": renderer,
+        "seconds": elapsed,
+        "peak_rss_mb": max(peak_self, peak_children) / 1024,
+        "output_mb": os.path.getsize(output_path) / (1024 * 1024),
+        "output_seconds": get_media_duration(output_path),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=5, help="Number of images (default: 5)")
+    parser.add_argument('--duration', type=float, default=60, help="Audio duration in seconds (default: 60)")
+    parser.add_argument('--renderers', nargs='+', default=list(RENDERERS), choices=RENDERERS)
+    parser.add_argument('--render-profile', choices=sorted(RENDER_PROFILES),
+                        help="Render profile (default: RENDER_PROFILE)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="render_benchmark_")
+    try:
+        timeline, audio_path = make_inputs(work_dir, args.images, args.duration)
+        print(f"{args.images} images, {args.duration:.0f}s of audio, "
+              f"render profile {get_render_profile(args.render_profile).name}")
+        print(f"{'renderer':<12}{'seconds':>10}{'peak RSS MB':>14}{'output MB':>12}{'output s':>10}")
+
+        results = []
+        for renderer in args.renderers:
+            output_path = os.path.join(work_dir, f"{renderer}.mp4")
+            # A fresh process per renderer keeps the peak memory figures independent
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(
+                    run_renderer, renderer, timeline, audio_path, output_path, args.render_profile
+                ).result()
+            results.append(result)
+            print(f"{result['renderer']:<12}{result['seconds']:>10.2f}"
+                  f"{result['peak_rss_mb']:>14.1f}{result['output_mb']:>12.2f}{result['output_seconds']:>10.2f}")
+
+        if len(results) > 1:
+            fastest = min(results, key=lambda r: r['seconds'])
+            for result in results:
+                if result is not fastest:
+                    print(f"{fastest['renderer']} is {result['seconds'] / fastest['seconds']:.1f}x faster "
+                          f"than {result['renderer']}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
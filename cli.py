@@ -0,0 +1,272 @@
+"""
+Command line entry points that do not need the HTTP API.
+
+batch queues one job per topic in the same job queue and task store as the
+API; the jobs are run by the workers (worker.py or the worker embedded in the
+API):
+
+    TASK_STORE=sqlite:///output/tasks.db python cli.py batch topics.txt --wait
+
+run generates the videos of a JSONL manifest in this process, without the
+queue, each job in its own directory, and prints a throughput summary:
+
+    python cli.py run manifest.jsonl --concurrency 4 --output-dir output/bulk
+
+Each manifest line is a JSON object with the fields of the API's VideoRequest
+("topic" is required, the others default to the command line options) and an
+optional "id" naming the job's directory.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+from core.batch import new_task, submit_batch, batch_status, validate_video_options, BATCH_PRIORITY
+from core.generator import PROMPT_MODES
+from core.job_queue import JobQueue
+from core.render import OUTPUT_FORMATS, render_pool
+from core.task_store import create_task_store, InMemoryTaskStore
+from core.clients import close_clients
+from core.tts import TTS_BACKENDS
+from core.profiles import RENDER_PROFILES
+from core.web_search import SEARCH_MODES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def read_topics(path):
+    """Read one topic per line ('-' for stdin), skipping blank lines and # comments."""
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        return [line.strip() for line in source if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+def add_video_options(parser):
+    """Options shared by every video, matching the fields of the API's VideoRequest."""
+    parser.add_argument('--num-images', type=int, default=5, choices=range(1, 11), metavar='1-10')
+    parser.add_argument('--language', default='en')
+    parser.add_argument('--text-model', type=int, default=0, choices=(0, 1), help="0: GPT-4, 1: GPT-3.5")
+    parser.add_argument('--image-model', type=int, default=1, choices=(0, 1), help="0: DALL-E 2, 1: DALL-E 3")
+    parser.add_argument('--video-length', type=int, default=1, choices=(0, 1, 2), help="0: 30s, 1: 1min, 2: 4min")
+    parser.add_argument('--no-web-search', dest='use_web_search', action='store_false')
+    parser.add_argument('--prompt-mode', choices=PROMPT_MODES)
+    parser.add_argument('--search-mode', choices=SEARCH_MODES)
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS)
+    parser.add_argument('--tts-backend', choices=TTS_BACKENDS)
+    parser.add_argument('--render-profile', choices=list(RENDER_PROFILES))
+
+def video_options(args):
+    return {
+        "num_images": args.num_images,
+        "language": args.language,
+        "text_model": args.text_model,
+        "image_model": args.image_model,
+        "video_length": args.video_length,
+        "openai_key": None,
+        "use_web_search": args.use_web_search,
+        "prompt_mode": args.prompt_mode,
+        "search_mode": args.search_mode,
+        "output_format": args.output_format,
+        "tts_backend": args.tts_backend,
+        "render_profile": args.render_profile,
+    }
+
+def wait_for_batch(queue, tasks, batch_id, interval):
+    """Print the batch progress until every item has finished; returns the final status."""
+    while True:
+        status = batch_status(queue, tasks, batch_id)
+        counts = ", ".join(f"{count} {name}" for name, count in sorted(status["counts"].items()))
+        print(f"{status['progress']:5.1f}%  {counts}", flush=True)
+        if status["status"] == "completed":
+            return status
+        time.sleep(interval)
+
+def run_batch(args):
+    topics = read_topics(args.topics)
+    tasks = create_task_store()
+    if isinstance(tasks, InMemoryTaskStore):
+        logger.warning("TASK_STORE is 'memory': workers and the API will not see these tasks")
+
+    queue = JobQueue()
+    batch_id, task_ids = submit_batch(queue, tasks, topics, video_options(args), priority=args.priority)
+    print(f"Batch {batch_id}: {len(task_ids)} videos queued", flush=True)
+
+    if not args.wait:
+        return 0
+    status = wait_for_batch(queue, tasks, batch_id, args.interval)
+    for item in status["tasks"]:
+        if item["status"] != "completed":
+            print(f"{item['status']}: {item['topic']} ({item['task_id']}) {item['error'] or ''}".rstrip())
+    return 0 if status["counts"].get("completed", 0) == status["total"] else 1
+
+def read_manifest(path, defaults):
+    """
+    Return the jobs of a JSONL manifest with the defaults filled in.
+
+    Every job is validated up front, so a bad line stops the run before any
+    paid call is made for the jobs above it; raises ValueError on bad lines.
+    """
+    jobs = []
+    seen_ids = set()
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({str(e)})")
+            if not isinstance(entry, dict) or not str(entry.get("topic", "")).strip():
+                raise ValueError(f"{path}:{line_number}: a job needs a topic")
+
+            unknown = set(entry) - set(defaults) - {"topic", "id"}
+            if unknown:
+                logger.warning(f"{path}:{line_number}: ignoring unknown fields {', '.join(sorted(unknown))}")
+
+            job_id = str(entry.get("id") or f"job-{line_number:05d}")
+            if not re.match(r'^[\w.-]+$', job_id) or job_id in seen_ids:
+                raise ValueError(f"{path}:{line_number}: invalid or duplicate id {job_id!r}")
+            seen_ids.add(job_id)
+
+            job = dict(defaults)
+            job.update({key: value for key, value in entry.items() if key in defaults})
+            job["topic"] = entry["topic"].strip()
+            job["id"] = job_id
+            try:
+                validate_video_options(job)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: {str(e)}")
+            jobs.append(job)
+    return jobs
+
+async def run_job(job, tasks, output_root):
+    """Generate one manifest job into output_root/<id>; returns its result record."""
+    from core.generator import VideoGenerator
+
+    output_dir = os.path.join(output_root, job["id"])
+    os.makedirs(output_dir, exist_ok=True)
+
+    task_id = str(uuid.uuid4())
+    tasks.create(task_id, new_task(job["topic"]))
+    start = time.perf_counter()
+    error = None
+    generator = None
+    try:
+        generator = VideoGenerator(task_id=task_id, tasks=tasks, openai_key=job.get("openai_key"))
+        await generator.generate(
+            topic=job["topic"],
+            num_images=job["num_images"],
+            language=job["language"],
+            text_model=job["text_model"],
+            image_model=job["image_model"],
+            video_length=job["video_length"],
+            output_dir=output_dir,
+            use_web_search=job["use_web_search"],
+            prompt_mode=job["prompt_mode"],
+            search_mode=job["search_mode"],
+            output_format=job["output_format"],
+            tts_backend=job["tts_backend"],
+            render_profile=job["render_profile"]
+        )
+    except Exception as e:
+        error = str(e)
+    finally:
+        if generator is not None:
+            await generator.close()
+
+    task = tasks.get(task_id) or {}
+    result = {
+        "id": job["id"],
+        "topic": job["topic"],
+        "status": task.get("status", "failed") if error is None else "failed",
+        "error": error or task.get("error"),
+        "seconds": round(time.perf_counter() - start, 2),
+        "video": os.path.join(output_dir, f"{task_id}.mp4") if task.get("status") == "completed" else None,
+        "stages": {name: stage.get("duration") for name, stage in (task.get("stages") or {}).items()},
+    }
+    print(f"[{result['status']}] {job['id']} in {result['seconds']:.1f}s: {job['topic']}", flush=True)
+    return result
+
+async def run_manifest(jobs, concurrency, output_root):
+    # In-process runs do not need a shared store
+    tasks = InMemoryTaskStore()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_bounded(job):
+        async with semaphore:
+            return await run_job(job, tasks, output_root)
+
+    try:
+        return await asyncio.gather(*(run_bounded(job) for job in jobs))
+    finally:
+        render_pool.shutdown()
+        await close_clients()
+
+def print_summary(results, elapsed):
+    """Print counts, throughput and the mean duration of each pipeline stage."""
+    completed = [result for result in results if result["status"] == "completed"]
+    print(f"\n{len(completed)}/{len(results)} videos completed in {elapsed:.1f}s "
+          f"({len(completed) / elapsed * 3600:.1f} videos/hour)")
+    if completed:
+        print(f"Mean time per video: {sum(r['seconds'] for r in completed) / len(completed):.1f}s")
+        stage_names = sorted({name for result in completed for name in result["stages"]})
+        for name in stage_names:
+            durations = [r["stages"][name] for r in completed if r["stages"].get(name) is not None]
+            if durations:
+                print(f"  {name:<8} {sum(durations) / len(durations):7.1f}s mean")
+    for result in results:
+        if result["status"] != "completed":
+            print(f"{result['status']}: {result['id']} ({result['topic']}) {result['error'] or ''}".rstrip())
+
+def run_manifest_command(args):
+    try:
+        jobs = read_manifest(args.manifest, video_options(args))
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Running {len(jobs)} jobs, {args.concurrency} at a time, into {args.output_dir}", flush=True)
+
+    start = time.perf_counter()
+    results = asyncio.run(run_manifest(jobs, args.concurrency, args.output_dir))
+    elapsed = time.perf_counter() - start
+
+    with open(os.path.join(args.output_dir, "results.jsonl"), 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print_summary(results, elapsed)
+    return 0 if all(result["status"] == "completed" for result in results) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MAVEN command line")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch = commands.add_parser('batch', help="Queue one video per topic")
+    batch.add_argument('topics', help="File with one topic per line, or '-' for stdin")
+    add_video_options(batch)
+    batch.add_argument('--priority', type=int, default=BATCH_PRIORITY,
+                       help=f"Queue priority of the batch items (default: {BATCH_PRIORITY})")
+    batch.add_argument('--wait', action='store_true', help="Follow the batch progress until it finishes")
+    batch.add_argument('--interval', type=float, default=5.0, help="Seconds between progress lines with --wait")
+    batch.set_defaults(handler=run_batch)
+
+    run = commands.add_parser('run', help="Generate the jobs of a JSONL manifest in this process")
+    run.add_argument('manifest', help="JSONL file, one job per line")
+    add_video_options(run)
+    run.add_argument('--concurrency', type=int, default=2, help="Jobs generated at the same time (default: 2)")
+    run.add_argument('--output-dir', default=os.path.join("output", "runs"),
+                     help="Each job is written to <output-dir>/<id> (default: output/runs)")
+    run.set_defaults(handler=run_manifest_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import uuid
+import logging
+from datetime import datetime
+from core.generator import PROMPT_MODES, LANGUAGES, detect_language
+from core.profiles import RENDER_PROFILES
+from core.render import OUTPUT_FORMATS
+from core.task_store import FINISHED_STATUSES
+from core.tts import TTS_BACKENDS
+from core.web_search import SEARCH_MODES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Largest number of topics accepted in one batch
+BATCH_MAX_TOPICS = int(os.getenv('BATCH_MAX_TOPICS', '500'))
+# Default queue priority of batch items: below single requests, so interactive users are not stuck behind a batch
+BATCH_PRIORITY = int(os.getenv('BATCH_PRIORITY', '-1'))
+
+# Final job statuses in the queue and the task status each one stands for
+_JOB_TASK_STATUSES = {"done": "completed", "failed": "failed", "cancelled": "cancelled"}
+
+# Choices of the numeric VideoRequest options
+TEXT_MODELS = (0, 1)  # 0: GPT-4, 1: GPT-3.5
+IMAGE_MODELS = (0, 1)  # 0: DALL-E 2, 1: DALL-E 3
+VIDEO_LENGTHS = (0, 1, 2)  # 0: 30s, 1: 1min, 2: 4min
+
+def validate_video_options(options):
+    """
+    Check the options of a video (a VideoRequest dict) before any work is
+    queued or started; raises ValueError describing the first invalid one.
+    """
+    num_images = options.get("num_images")
+    if not isinstance(num_images, int) or not 1 <= num_images <= 10:
+        raise ValueError("Number of images must be between 1 and 10")
+
+    if detect_language(options.get("language")) is None:
+        raise ValueError(f"Language must be one of: {', '.join(LANGUAGES)}")
+
+    for name, label, choices in (("text_model", "Text model", TEXT_MODELS),
+                                 ("image_model", "Image model", IMAGE_MODELS),
+                                 ("video_length", "Video length", VIDEO_LENGTHS)):
+        if options.get(name) not in choices:
+            raise ValueError(f"{label} must be one of: {', '.join(str(choice) for choice in choices)}")
+
+    for name, label, choices in (("prompt_mode", "Prompt mode", PROMPT_MODES),
+                                 ("search_mode", "Search mode", SEARCH_MODES),
+                                 ("output_format", "Output format", OUTPUT_FORMATS),
+                                 ("tts_backend", "TTS backend", TTS_BACKENDS),
+                                 ("render_profile", "Render profile", RENDER_PROFILES)):
+        if options.get(name) is not None and options[name] not in choices:
+            raise ValueError(f"{label} must be one of: {', '.join(choices)}")
+
+def new_task(topic, batch_id=None):
+    """Return the initial task record of a queued video."""
+    task = {
+        "status": "queued",
+        "current_step": "Initializing",
+        "progress": 0,
+        "topic": topic,
+        "created_at": datetime.now().isoformat()
+    }
+    if batch_id:
+        task["batch_id"] = batch_id
+    return task
+
+def submit_batch(queue, tasks, topics, options, priority=BATCH_PRIORITY):
+    """
+    Queue one video per topic with the same options (a VideoRequest dict without topic).
+
+    Every item is an ordinary job: the workers pick them up like any other, and
+    the items share the process-wide clients, web search results and artifact
+    cache. Returns (batch_id, task_ids) in topic order.
+    """
+    if not topics:
+        raise ValueError("A batch needs at least one topic")
+    if len(topics) > BATCH_MAX_TOPICS:
+        raise ValueError(f"A batch accepts at most {BATCH_MAX_TOPICS} topics")
+
+    batch_id = str(uuid.uuid4())
+    jobs = []
+    for topic in topics:
+        task_id = str(uuid.uuid4())
+        tasks.create(task_id, new_task(topic, batch_id))
+        jobs.append((task_id, dict(options, topic=topic, priority=priority)))
+
+    queue.enqueue_many(jobs, priority=priority, batch_id=batch_id)
+    logger.info(f"Batch {batch_id} queued with {len(jobs)} topics")
+    return batch_id, [task_id for task_id, _ in jobs]
+
+def batch_status(queue, tasks, batch_id):
+    """Return the aggregate status of a batch and of each of its items, or None if it does not exist."""
+    jobs = queue.batch_jobs(batch_id)
+    if not jobs:
+        return None
+
+    items = []
+    counts = {}
+    for task_id, job_status in jobs:
+        # Evicted tasks are reported from the queue's own record
+        task = tasks.get(task_id) or {"status": _JOB_TASK_STATUSES.get(job_status, job_status)}
+        status = task.get("status", "queued")
+        progress = 100 if status in FINISHED_STATUSES else task.get("progress", 0)
+        counts[status] = counts.get(status, 0) + 1
+        items.append({
+            "task_id": task_id,
+            "topic": task.get("topic"),
+            "status": status,
+            "progress": progress,
+            "error": task.get("error")
+        })
+
+    if all(item["status"] in FINISHED_STATUSES for item in items):
+        status = "completed"
+    elif all(item["status"] == "queued" for item in items):
+        status = "queued"
+    else:
+        status = "processing"
+
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "total": len(items),
+        "counts": counts,
+        "progress": sum(item["progress"] for item in items) / len(items),
+        "tasks": items
+    }
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Artifact cache settings
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+# Bump to invalidate every entry when the meaning of a stage's inputs changes
+CACHE_VERSION = 1
+
+def normalize_text(text, lowercase=False):
+    """Collapse whitespace (and optionally case) so near-identical inputs share a key."""
+    text = " ".join(str(text).split())
+    return text.lower() if lowercase else text
+
+def cache_key(stage, inputs):
+    """Return the content address of a stage's output given its inputs."""
+    payload = json.dumps(
+        {"version": CACHE_VERSION, "stage": stage, "inputs": inputs},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ArtifactCache:
+    """
+    Content-addressed cache for pipeline artifacts.
+
+    Entries are addressed by the stage name and its normalized inputs; values
+    are JSON documents (essays, prompts) or files (images, speech). Hits and
+    misses are counted per stage.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _read(self, key):
+        raise NotImplementedError
+
+    def _write(self, key, data):
+        raise NotImplementedError
+
+    def _read_file(self, key, dest_path):
+        data = self._read(key)
+        if data is None:
+            return False
+        with open(dest_path, 'wb') as f:
+            f.write(data)
+        return True
+
+    def _write_file(self, key, src_path):
+        with open(src_path, 'rb') as f:
+            self._write(key, f.read())
+
+    def _count(self, stage, hit):
+        with self._stats_lock:
+            counters = self._stats.setdefault(stage, {"hits": 0, "misses": 0})
+            counters["hits" if hit else "misses"] += 1
+
+    def get_json(self, stage, inputs, max_age=None):
+        """Return the cached value, or None on a miss or if it is older than max_age seconds."""
+        value = None
+        data = self._read(cache_key(stage, inputs))
+        if data is not None:
+            entry = json.loads(data)
+            if max_age is None or time.time() - entry["created_at"] <= max_age:
+                value = entry["value"]
+        self._count(stage, value is not None)
+        return value
+
+    def put_json(self, stage, inputs, value):
+        entry = {"created_at": time.time(), "value": value}
+        self._write(cache_key(stage, inputs), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+    def get_file(self, stage, inputs, dest_path):
+        """Copy the cached file to dest_path. Returns False on a miss."""
+        hit = self._read_file(cache_key(stage, inputs), dest_path)
+        self._count(stage, hit)
+        return hit
+
+    def put_file(self, stage, inputs, src_path):
+        self._write_file(cache_key(stage, inputs), src_path)
+
+    def stats(self):
+        """Return hit/miss counters per stage (for this process)."""
+        with self._stats_lock:
+            return {stage: dict(counters) for stage, counters in self._stats.items()}
+
+class DiskArtifactCache(ArtifactCache):
+    """
+    Artifact cache stored as one file per entry under a directory, evicting the
+    least recently used entries once the total size exceeds max_bytes.
+
+    Reads touch the entry's modification time, which is used as the LRU clock,
+    so the cache directory can be shared by several processes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        super().__init__()
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = self._scan()[1]
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _scan(self):
+        """Return (entries sorted oldest first, total size in bytes)."""
+        entries = []
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        return entries, total
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return data
+
+    def _read_file(self, key, dest_path):
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, dest_path)
+        except FileNotFoundError:
+            return False
+        self._touch(path)
+        return True
+
+    def _store(self, key, write):
+        # Write to a temporary file and rename it so readers never see partial entries
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            size = os.path.getsize(tmp_path)
+            # An overwritten entry's size no longer counts
+            try:
+                replaced_size = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._size += size - replaced_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _write(self, key, data):
+        self._store(key, lambda f: f.write(data))
+
+    def _write_file(self, key, src_path):
+        def write(f):
+            with open(src_path, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        self._store(key, write)
+
+    def _evict(self):
+        # Rescan: other processes sharing the directory may have added or evicted entries
+        entries, total = self._scan()
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if os.path.basename(path).startswith(".tmp-"):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._size = total
+        logger.info(f"Artifact cache evicted {evicted} entries, {total} bytes in use")
+
+class TTLCache:
+    """
+    Small thread-safe in-memory cache whose entries expire after ttl seconds.
+
+    When full, the entry closest to expiry is dropped to make room.
+    """
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                expired = [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]
+                for k in expired:
+                    del self._entries[k]
+                if len(self._entries) >= self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide artifact cache, or None if caching is disabled."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskArtifactCache()
+        return _cache
@@ -0,0 +1,177 @@
+import os
+import asyncio
+import logging
+import weakref
+import threading
+from collections import OrderedDict
+import aiohttp
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Connections kept per OpenAI client and by the shared aiohttp session used for downloads
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '20'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '50'))
+# Seconds an idle keep-alive connection stays open
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', '30'))
+# Clients kept for distinct API keys; beyond this the least recently used one is
+# dropped from the pool and closed once no task uses it any more
+CLIENT_POOL_MAX_KEYS = int(os.getenv('CLIENT_POOL_MAX_KEYS', '16'))
+
+class _KeyedPool:
+    """
+    Clients shared per API key, at most max_keys of them.
+
+    Tasks that keep a client for their whole run acquire() it and release() it
+    when done. A client evicted from the pool while tasks still hold it stays
+    open until the last of them releases it; get() and acquire() return the
+    evicted clients nobody holds, for the caller to close.
+    """
+
+    def __init__(self, create, max_keys=CLIENT_POOL_MAX_KEYS):
+        self._create = create
+        self.max_keys = max_keys
+        self._clients = OrderedDict()
+        # id(client) -> [client, number of holders], including evicted clients still held
+        self._holders = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, acquire=False):
+        """Return (client for key, evicted clients to close)."""
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(key)
+                self._clients[key] = client
+            else:
+                self._clients.move_to_end(key)
+            if acquire:
+                self._holders.setdefault(id(client), [client, 0])[1] += 1
+
+            evicted = []
+            while len(self._clients) > self.max_keys:
+                _, old = self._clients.popitem(last=False)
+                if id(old) not in self._holders:
+                    evicted.append(old)
+            return client, evicted
+
+    def release(self, client):
+        """Drop one hold on client; returns True when it was evicted and is now unused, i.e. must be closed."""
+        with self._lock:
+            holder = self._holders.get(id(client))
+            if holder is None:
+                return False
+            holder[1] -= 1
+            if holder[1] > 0:
+                return False
+            del self._holders[id(client)]
+            return not any(pooled is client for pooled in self._clients.values())
+
+    def drain(self):
+        """Empty the pool and return every client, pooled or still held, to close them."""
+        with self._lock:
+            clients = {id(client): client for client in self._clients.values()}
+            clients.update((key, client) for key, (client, _) in self._holders.items())
+            self._clients.clear()
+            self._holders.clear()
+            return list(clients.values())
+
+def _create_openai_client(api_key):
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+            )
+        )
+    )
+
+def _create_web_search_agent(api_key):
+    # Imported here: the agent pulls in Swarm and DuckDuckGo, which only web search needs
+    from core.web_search import WebSearchAgent
+    return WebSearchAgent(openai_key=api_key)
+
+class _LoopClients:
+    """Async clients bound to one event loop (httpx and aiohttp connections cannot move between loops)."""
+
+    def __init__(self):
+        self.openai = _KeyedPool(_create_openai_client)
+        self.http_session = None
+
+# Async clients per event loop, and web search agents (thread-safe, loop independent) per key
+_loop_clients = weakref.WeakKeyDictionary()
+_web_search_agents = _KeyedPool(_create_web_search_agent)
+
+def _resolve_key(api_key):
+    return api_key or os.getenv('OPENAI_API_KEY')
+
+def _get_loop_clients():
+    loop = asyncio.get_running_loop()
+    clients = _loop_clients.get(loop)
+    if clients is None:
+        clients = _LoopClients()
+        _loop_clients[loop] = clients
+    return clients
+
+def get_openai_client(api_key=None, acquire=False):
+    """
+    Return the shared AsyncOpenAI client for api_key (default: OPENAI_API_KEY) on the running loop.
+
+    With acquire, the caller holds the client until release_openai_client(),
+    so it stays open even if the pool drops it meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    client, evicted = _get_loop_clients().openai.get(_resolve_key(api_key), acquire)
+    for old in evicted:
+        loop.create_task(old.close())
+    return client
+
+async def release_openai_client(client):
+    """Release a client taken with get_openai_client(acquire=True) on the same loop."""
+    clients = _loop_clients.get(asyncio.get_running_loop())
+    if clients is not None and clients.openai.release(client):
+        await client.close()
+
+def get_http_session():
+    """Return the shared aiohttp session (keep-alive, HTTP_POOL_SIZE connections) for the running loop."""
+    clients = _get_loop_clients()
+    if clients.http_session is None or clients.http_session.closed:
+        clients.http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_SECONDS)
+        )
+    return clients.http_session
+
+def get_web_search_agent(api_key=None, acquire=False):
+    """Return the shared WebSearchAgent for api_key (default: OPENAI_API_KEY); acquire as for get_openai_client."""
+    agent, evicted = _web_search_agents.get(_resolve_key(api_key), acquire)
+    for old in evicted:
+        old.close()
+    return agent
+
+def release_web_search_agent(agent):
+    """Release an agent taken with get_web_search_agent(acquire=True)."""
+    if _web_search_agents.release(agent):
+        agent.close()
+
+async def close_clients():
+    """Close the clients created on the running loop; call on application or worker shutdown."""
+    # Web search agents are not tied to a loop; each process runs one loop, which is shut down here
+    agents = _web_search_agents.drain()
+    for agent in agents:
+        agent.close()
+
+    clients = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if clients is None:
+        return
+    openai_clients = clients.openai.drain()
+    for client in openai_clients:
+        await client.close()
+    if clients.http_session is not None and not clients.http_session.closed:
+        await clients.http_session.close()
+    logger.info(f"Closed {len(openai_clients)} OpenAI clients, {len(agents)} web search agents "
+                f"and the shared HTTP session")
@@ -0,0 +1,159 @@
+import os
+import stat
+import logging
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+import anyio
+from starlette.responses import Response
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes read per chunk when streaming the file (always the case under uvicorn)
+FILE_CHUNK_SIZE = int(os.getenv('FILE_CHUNK_SIZE', str(256 * 1024)))
+
+def parse_range(header, size):
+    """
+    Parse a Range header against a file of size bytes.
+
+    Returns (start, end) with end inclusive, None when the header should be
+    ignored (missing, not in bytes or several ranges, which are served as the
+    full file) and raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    start, _, end = spec.partition("-")
+    try:
+        if start:
+            start = int(start)
+            end = int(end) if end else size - 1
+        else:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            start, end = max(size - length, 0), size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+class RangeFileResponse(Response):
+    """
+    File response with byte-range and conditional request support.
+
+    - ``Range: bytes=...`` (single range) answers 206 with the requested slice,
+      and 416 when it is out of bounds; ``If-Range`` is honoured
+    - ``If-None-Match`` / ``If-Modified-Since`` answer 304 when unchanged
+    - the body is streamed in FILE_CHUNK_SIZE chunks. Only servers offering the
+      ``http.response.zerocopysend`` ASGI extension get the file handed over
+      for sendfile instead; uvicorn, which serves the API, does not offer it,
+      so there the chunked path is the one that runs
+    """
+
+    def __init__(self, path, request_headers, media_type="application/octet-stream", filename=None,
+                 inline=False, method="GET"):
+        self.path = path
+        self.request_headers = request_headers
+        self.media_type = media_type
+        self.background = None
+        self.send_header_only = method.upper() == "HEAD"
+        self.status_code = 200
+        self.init_headers({})
+        self.headers["accept-ranges"] = "bytes"
+        if filename is not None:
+            disposition = "inline" if inline else "attachment"
+            self.headers["content-disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+    def _prepare(self, stat_result):
+        """Set the validators and return the (start, end) slice to send, or None for no body."""
+        size = stat_result.st_size
+        etag = '"' + hashlib.md5(f"{stat_result.st_mtime_ns}-{size}".encode()).hexdigest() + '"'
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+
+        if self._not_modified(etag, stat_result.st_mtime):
+            self.status_code = 304
+            return None
+
+        byte_range = None
+        if_range = self.request_headers.get("if-range")
+        if if_range is None or if_range == etag:
+            try:
+                byte_range = parse_range(self.request_headers.get("range"), size)
+            except ValueError:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                return None
+
+        if byte_range is None:
+            byte_range = (0, size - 1)
+        else:
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        self.headers["content-length"] = str(byte_range[1] - byte_range[0] + 1)
+        return byte_range
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def __call__(self, scope, receive, send):
+        try:
+            stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        except FileNotFoundError:
+            raise RuntimeError(f"File at path {self.path} does not exist.")
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise RuntimeError(f"File at path {self.path} is not a file.")
+
+        byte_range = self._prepare(stat_result)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if byte_range is None or self.send_header_only or stat_result.st_size == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        start, end = byte_range
+        count = end - start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                # The server copies the file to the socket itself (sendfile); not offered by uvicorn
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": start,
+                    "count": count,
+                    "more_body": False
+                })
+                return
+
+            await file.seek(start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank while it was being sent
+                logger.warning(f"{self.path} ended {remaining} bytes early")
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,109 @@
+import os
+import logging
+import numpy as np
+from PIL import Image, ImageOps
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Output video size as WIDTHxHEIGHT, e.g. 1080x1920 for vertical video (both even, for 4:2:0 chroma)
+VIDEO_RESOLUTION = os.getenv('VIDEO_RESOLUTION', '1024x1024')
+# How images that do not match the output aspect ratio are fitted: "letterbox" (bars) or "crop" (fill)
+FRAME_FITS = ("letterbox", "crop")
+VIDEO_FIT = os.getenv('VIDEO_FIT', 'letterbox')
+
+# Prepared frame formats: "yuv420p" (single-frame YUV4MPEG2 files ffmpeg reads without
+# decoding) and "rgb24" (raw RGB memory-mapped as moviepy frames)
+FRAME_FORMATS = ("yuv420p", "rgb24")
+_FRAME_EXTENSIONS = {"yuv420p": ".y4m", "rgb24": ".rgb"}
+
+def parse_resolution(value):
+    """Parse "WIDTHxHEIGHT" into (width, height); both must be positive and even."""
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid resolution {value!r}, expected WIDTHxHEIGHT")
+    if width <= 0 or height <= 0 or width % 2 or height % 2:
+        raise ValueError(f"Invalid resolution {value!r}: width and height must be positive and even")
+    return width, height
+
+VIDEO_SIZE = parse_resolution(VIDEO_RESOLUTION)
+
+def fit_image(image, size, fit=VIDEO_FIT):
+    """Resize an RGB image to exactly size, letterboxed in black or cropped around the center."""
+    if fit not in FRAME_FITS:
+        raise ValueError(f"Unsupported frame fit: {fit}")
+    if image.size == tuple(size):
+        return image
+    if fit == "crop":
+        return ImageOps.fit(image, size, Image.LANCZOS)
+    return ImageOps.pad(image, size, Image.LANCZOS, color=(0, 0, 0))
+
+def rgb_to_yuv420(rgb):
+    """
+    Convert an RGB array (height, width, 3) to planar YUV 4:2:0 bytes.
+
+    BT.709 coefficients, limited range, chroma averaged over 2x2 blocks
+    (centered siting, "420jpeg" in YUV4MPEG2 terms).
+    """
+    height, width, _ = rgb.shape
+    rgb = rgb.astype(np.float32)
+    y = 16 + (0.2126 * rgb[..., 0] + 0.7152 * rgb[..., 1] + 0.0722 * rgb[..., 2]) * (219 / 255)
+    blocks = rgb.reshape(height // 2, 2, width // 2, 2, 3).mean(axis=(1, 3))
+    r, g, b = blocks[..., 0], blocks[..., 1], blocks[..., 2]
+    u = 128 + (-0.1146 * r - 0.3854 * g + 0.5 * b) * (224 / 255)
+    v = 128 + (0.5 * r - 0.4542 * g - 0.0458 * b) * (224 / 255)
+    return b"".join(
+        np.clip(np.rint(plane), 0, 255).astype(np.uint8).tobytes() for plane in (y, u, v)
+    )
+
+def frame_path(image_path, frames_dir, size, fit, pixel_format):
+    """Where the prepared frame of an image goes; the name records how it was prepared."""
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(frames_dir, f"{name}.{size[0]}x{size[1]}.{fit}{_FRAME_EXTENSIONS[pixel_format]}")
+
+def is_prepared_frame(path, size, fit, pixel_format):
+    return path.endswith(f".{size[0]}x{size[1]}.{fit}{_FRAME_EXTENSIONS[pixel_format]}")
+
+def prepare_frame(image_path, frames_dir, size=VIDEO_SIZE, fit=VIDEO_FIT, pixel_format="yuv420p"):
+    """
+    Decode an image once, fit it to the output size and write it as a raw frame.
+
+    Returns the frame's path. The renderers then use the frame for every video
+    frame the image is shown in, with no further decoding or scaling.
+    """
+    if pixel_format not in FRAME_FORMATS:
+        raise ValueError(f"Unsupported frame format: {pixel_format}")
+    os.makedirs(frames_dir, exist_ok=True)
+    path = frame_path(image_path, frames_dir, size, fit, pixel_format)
+
+    with Image.open(image_path) as image:
+        rgb = np.asarray(fit_image(image.convert("RGB"), size, fit))
+
+    part_path = path + ".part"
+    with open(part_path, 'wb') as f:
+        if pixel_format == "yuv420p":
+            f.write(f"YUV4MPEG2 W{size[0]} H{size[1]} F25:1 Ip A1:1 C420jpeg XCOLORRANGE=LIMITED\n".encode())
+            f.write(b"FRAME\n")
+            f.write(rgb_to_yuv420(rgb))
+        else:
+            f.write(np.ascontiguousarray(rgb).tobytes())
+    os.replace(part_path, path)
+    return path
+
+def load_rgb_frame(path, size):
+    """Memory-map a prepared rgb24 frame as a (height, width, 3) array."""
+    width, height = size
+    return np.memmap(path, dtype=np.uint8, mode='r', shape=(height, width, 3))
+
+def prepare_timeline_frames(timeline, frames_dir, size=VIDEO_SIZE, fit=VIDEO_FIT, pixel_format="yuv420p"):
+    """Return a copy of the timeline showing prepared frames, preparing those that are missing."""
+    frames = {}
+    for cue in timeline.cues:
+        if cue.image_path not in frames:
+            if is_prepared_frame(cue.image_path, size, fit, pixel_format):
+                frames[cue.image_path] = cue.image_path
+            else:
+                frames[cue.image_path] = prepare_frame(cue.image_path, frames_dir, size, fit, pixel_format)
+    return timeline.with_images(frames)
@@ -1,18 +1,30 @@
 import os
-from openai import AsyncOpenAI
-from PIL import Image
-from io import BytesIO
-from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip, CompositeVideoClip
-from gtts import gTTS
 import nltk
-from nltk.tokenize import sent_tokenize
 import os
 from dotenv import load_dotenv
 import logging
 import shutil
-import aiohttp
 import asyncio
-from core.web_search import WebSearchAgent
+import json
+import base64
+import weakref
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from core.pipeline import Pipeline, Stage
+from core.render import render_pool, RenderCancelled, OUTPUT_FORMAT, task_scratch_dir, publish_file, frame_format
+from core.frames import prepare_frame, VIDEO_SIZE
+from core.profiles import get_render_profile
+from core.slideshow import HLS_PLAYLIST_NAME
+from core.task_store import TaskStore
+from core.cache import get_cache, normalize_text
+from core.speech import split_sentences, concat_mp3, sentence_timings
+from core.timeline import split_portions, build_timeline
+from core.streaming import ItemStream, SentenceSplitter, PortionCutter, iterate_items
+from core.tts import get_tts_backend
+from core.web_search import WEB_SEARCH_MODE
+from core.clients import (get_openai_client, release_openai_client, get_http_session,
+                          get_web_search_agent, release_web_search_agent)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,14 +33,193 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Image generation limits: per task, across the whole process, and retries per image
+IMAGE_CONCURRENCY_PER_TASK = int(os.getenv('IMAGE_CONCURRENCY_PER_TASK', '5'))
+MAX_CONCURRENT_IMAGES = int(os.getenv('MAX_CONCURRENT_IMAGES', '10'))
+IMAGE_MAX_RETRIES = int(os.getenv('IMAGE_MAX_RETRIES', '2'))
+
+# One process-wide semaphore per event loop (asyncio primitives are bound to a loop)
+_image_semaphores = weakref.WeakKeyDictionary()
+
+def get_image_semaphore():
+    """Return the process-wide image generation semaphore for the running loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _image_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_IMAGES)
+        _image_semaphores[loop] = semaphore
+    return semaphore
+
+# How DALL-E returns images: "url" (downloaded afterwards) or "b64_json" (inline in the response)
+IMAGE_RESPONSE_FORMATS = ("url", "b64_json")
+IMAGE_RESPONSE_FORMAT = os.getenv('IMAGE_RESPONSE_FORMAT', 'url')
+# Image downloads are streamed to disk in chunks, resumed on failure and capped in size
+IMAGE_DOWNLOAD_CHUNK_SIZE = int(os.getenv('IMAGE_DOWNLOAD_CHUNK_SIZE', str(256 * 1024)))
+IMAGE_DOWNLOAD_RETRIES = int(os.getenv('IMAGE_DOWNLOAD_RETRIES', '2'))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(20 * 1024 ** 2)))
+
+# Leading bytes of the image formats DALL-E may return
+IMAGE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'RIFF')
+
+def check_image_header(header):
+    """Raise ValueError unless header starts like a PNG, JPEG or WebP file."""
+    if not header.startswith(IMAGE_SIGNATURES):
+        raise ValueError(f"Downloaded data is not an image (starts with {header[:8]!r})")
+
+async def download_image(session, url, image_path):
+    """Stream url to image_path without holding the image in memory.
+
+    Data is written to ``image_path + '.part'`` in chunks (writes run in a thread) and
+    renamed once complete, so a partial file is never taken for an image. A failed
+    transfer is resumed with a Range request up to IMAGE_DOWNLOAD_RETRIES times.
+    The length is checked against Content-Length and IMAGE_MAX_BYTES, and the first
+    bytes against the known image signatures.
+    """
+    part_path = image_path + '.part'
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+    for attempt in range(IMAGE_DOWNLOAD_RETRIES + 1):
+        written = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={written}-'} if written else {}
+        try:
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 206:
+                    expected = written + resp.content_length if resp.content_length is not None else 0
+                    mode = 'ab'
+                elif resp.status == 200:
+                    # The server ignored the range: start over
+                    written, expected, mode = 0, resp.content_length or 0, 'wb'
+                else:
+                    raise RuntimeError(f"Image download failed with HTTP {resp.status}")
+
+                if expected > IMAGE_MAX_BYTES:
+                    raise RuntimeError(f"Image too large ({expected} bytes)")
+
+                f = await asyncio.to_thread(open, part_path, mode)
+                try:
+                    async for chunk in resp.content.iter_chunked(IMAGE_DOWNLOAD_CHUNK_SIZE):
+                        if written == 0:
+                            check_image_header(chunk)
+                        written += len(chunk)
+                        if written > IMAGE_MAX_BYTES:
+                            raise RuntimeError(f"Image larger than {IMAGE_MAX_BYTES} bytes")
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+
+            if expected and written != expected:
+                raise aiohttp.ClientPayloadError(f"Image download incomplete: {written} of {expected} bytes")
+            if written == 0:
+                raise RuntimeError("Image download returned no data")
+            break
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Transport errors are resumed from the bytes already on disk; anything else is final
+            if attempt == IMAGE_DOWNLOAD_RETRIES:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+            logger.warning(f"Image download interrupted at {written} bytes (attempt {attempt + 1}), resuming: {str(e)}")
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+    os.replace(part_path, image_path)
+    return written
+
+async def write_b64_image(data, image_path):
+    """Decode a b64_json image and write it to image_path in a thread."""
+    def write():
+        content = base64.b64decode(data)
+        check_image_header(content)
+        part_path = image_path + '.part'
+        with open(part_path, 'wb') as f:
+            f.write(content)
+        os.replace(part_path, image_path)
+        return len(content)
+    return await asyncio.to_thread(write)
+
+# Speech is synthesized sentence by sentence: sentences in flight per task, threads
+# shared by every task (synthesis is blocking) and retries per sentence
+TTS_CONCURRENCY = int(os.getenv('TTS_CONCURRENCY', '4'))
+TTS_WORKERS = int(os.getenv('TTS_WORKERS', '8'))
+TTS_MAX_RETRIES = int(os.getenv('TTS_MAX_RETRIES', '2'))
+
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+# Essays written from web search results are reused for at most this many seconds
+CACHE_WEB_ESSAY_TTL = int(os.getenv('CACHE_WEB_ESSAY_TTL', '21600'))
+
+# Stream the essay completion and start speech and image prompts on its first sentences
+ESSAY_STREAMING = os.getenv('ESSAY_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+
+# How image prompts are requested: "sequential", "concurrent" or "batch"
+PROMPT_MODES = ("sequential", "concurrent", "batch")
+PROMPT_MODE = os.getenv('PROMPT_MODE', 'concurrent')
+
+# Accepted language names and codes
+LANGUAGES = {
+    'it': {'code': 'it', 'name': 'Italian', 'openai': 'Italian'},
+    'italiano': {'code': 'it', 'name': 'Italian', 'openai': 'Italian'},
+    'en': {'code': 'en', 'name': 'English', 'openai': 'English'},
+    'english': {'code': 'en', 'name': 'English', 'openai': 'English'},
+    'es': {'code': 'es', 'name': 'Spanish', 'openai': 'Spanish'},
+    'español': {'code': 'es', 'name': 'Spanish', 'openai': 'Spanish'},
+    'espanol': {'code': 'es', 'name': 'Spanish', 'openai': 'Spanish'},
+    'fr': {'code': 'fr', 'name': 'French', 'openai': 'French'},
+    'français': {'code': 'fr', 'name': 'French', 'openai': 'French'},
+    'francais': {'code': 'fr', 'name': 'French', 'openai': 'French'},
+    'de': {'code': 'de', 'name': 'German', 'openai': 'German'},
+    'deutsch': {'code': 'de', 'name': 'German', 'openai': 'German'}
+}
+
+def detect_language(lang_input):
+    """Return the LANGUAGES entry for a language name or code, or None if it is not supported."""
+    if not isinstance(lang_input, str):
+        return None
+    return LANGUAGES.get(lang_input.lower().strip())
+
+def parse_image_prompts(content, expected_count):
+    """Parse a batched prompt reply of the form {"prompts": [...]}.
+
+    Raises ValueError if the reply is not valid JSON or does not contain exactly
+    expected_count non-empty prompts.
+    """
+    content = content.strip()
+    if content.startswith("```"):
+        # Strip a markdown code fence around the JSON
+        content = content.strip("`")
+        if content.startswith("json"):
+            content = content[4:]
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in prompt reply: {str(e)}")
+
+    prompts = data.get("prompts") if isinstance(data, dict) else data
+    if not isinstance(prompts, list):
+        raise ValueError("Prompt reply does not contain a list of prompts")
+
+    prompts = [str(prompt).strip() for prompt in prompts]
+    if len(prompts) != expected_count or not all(prompts):
+        raise ValueError(f"Expected {expected_count} prompts, got {len([p for p in prompts if p])}")
+
+    return prompts
+
 class VideoGenerator:
-    def __init__(self, task_id: str, tasks: dict, openai_key: str = None):
+    def __init__(self, task_id: str, tasks: TaskStore, openai_key: str = None, image_concurrency: int = None):
         self.task_id = task_id
         self.tasks = tasks
-        self.client = AsyncOpenAI(
-            api_key=openai_key if openai_key else os.getenv('OPENAI_API_KEY')
-        )
-        self.web_search_agent = WebSearchAgent(openai_key=openai_key)
+        self.image_concurrency = image_concurrency or IMAGE_CONCURRENCY_PER_TASK
+        # Clients are shared by every task using the same API key (see core/clients.py) and
+        # held until close(), so the pool cannot close them while the task runs
+        self.client = get_openai_client(openai_key, acquire=True)
+        self.web_search_agent = get_web_search_agent(openai_key, acquire=True)
+        self._held_clients = (self.client, self.web_search_agent)
+        self.cache = get_cache()
         self.update_status("queued", "Initializing", 0)
 
         # Download NLTK data if needed
@@ -37,8 +228,17 @@ class VideoGenerator:
         except LookupError:
             nltk.download('punkt')
 
+    async def close(self):
+        """Release the shared clients; call once the generator is no longer used."""
+        if self._held_clients is None:
+            return
+        client, web_search_agent = self._held_clients
+        self._held_clients = None
+        await release_openai_client(client)
+        release_web_search_agent(web_search_agent)
+
     def update_status(self, status: str, step: str, progress: float, error: str = None):
-        self.tasks[self.task_id].update({
+        self.tasks.update(self.task_id, {
             "status": status,
             "current_step": step,
             "progress": progress,
@@ -47,23 +247,7 @@ class VideoGenerator:
         logger.info(f"Status updated - Status: {status}, Step: {step}, Progress: {progress}%")
 
     def detect_language(self, lang_input):
-        # Language mapping dictionary
-        language_map = {
-            'it': {'code': 'it', 'name': 'Italian', 'openai': 'Italian'},
-            'italiano': {'code': 'it', 'name': 'Italian', 'openai': 'Italian'},
-            'en': {'code': 'en', 'name': 'English', 'openai': 'English'},
-            'english': {'code': 'en', 'name': 'English', 'openai': 'English'},
-            'es': {'code': 'es', 'name': 'Spanish', 'openai': 'Spanish'},
-            'español': {'code': 'es', 'name': 'Spanish', 'openai': 'Spanish'},
-            'espanol': {'code': 'es', 'name': 'Spanish', 'openai': 'Spanish'},
-            'fr': {'code': 'fr', 'name': 'French', 'openai': 'French'},
-            'français': {'code': 'fr', 'name': 'French', 'openai': 'French'},
-            'francais': {'code': 'fr', 'name': 'French', 'openai': 'French'},
-            'de': {'code': 'de', 'name': 'German', 'openai': 'German'},
-            'deutsch': {'code': 'de', 'name': 'German', 'openai': 'German'}
-        }
-        
-        return language_map.get(lang_input.lower().strip())
+        return detect_language(lang_input)
 
     def get_system_message(self, length_option, language):
         # Define target word counts
@@ -80,11 +264,34 @@ class VideoGenerator:
         The essay should be approximately {word_count} words long to achieve a spoken duration of {duration:.1f} minutes.
         Make the essay vivid and descriptive, with clear imagery that can be visualized."""
 
-    async def generate_essay(self, topic, length_option, model_option, language):
-        """Generate an essay about the topic using OpenAI's API and web search."""
+    async def stream_essay(self, model, messages, language_name, on_sentence):
+        """Stream a chat completion, calling on_sentence with each sentence as soon as it is complete."""
+        splitter = SentenceSplitter(language_name)
+        parts = []
+        stream = await self.client.chat.completions.create(model=model, messages=messages, stream=True)
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            delta = chunk.choices[0].delta.content
+            parts.append(delta)
+            for sentence in splitter.feed(delta):
+                on_sentence(sentence)
+        for sentence in splitter.flush():
+            on_sentence(sentence)
+        return "".join(parts).strip()
+
+    async def generate_essay(self, topic, length_option, model_option, language, search_mode=None, on_sentence=None):
+        """Generate an essay about the topic using OpenAI's API and web search.
+
+        With on_sentence, the completion is streamed and on_sentence is called with
+        each sentence as it is written. An essay loaded from the cache is returned
+        without calling it.
+        """
         try:
             # Detect and validate language
             lang_info = self.detect_language(language)
+            if not lang_info:
+                raise ValueError(f"Unsupported language: {language}")
             
             # Define models
             models = {
@@ -97,12 +304,31 @@ class VideoGenerator:
             # Get system message based on length option
             system_message = self.get_system_message(length_option, lang_info['openai'])
             
+            use_web_search = self.web_search_agent is not None
+            search_mode = search_mode or WEB_SEARCH_MODE
+            cache_inputs = {
+                "topic": normalize_text(topic, lowercase=True),
+                "length_option": length_option,
+                "model": model,
+                "language": lang_info['code'],
+                "web_search": search_mode if use_web_search else False
+            }
+            if self.cache:
+                # Web search results go stale, so those essays are only reused for a while
+                max_age = CACHE_WEB_ESSAY_TTL if use_web_search else None
+                essay = self.cache.get_json("essay", cache_inputs, max_age=max_age)
+                if essay is not None:
+                    logger.info("Essay loaded from cache")
+                    return essay
+            
             logger.info(f"Using {model} with web search to generate essay in {lang_info['name']}...")
             
             # Utilizziamo l'agente di ricerca web per ottenere informazioni aggiornate
             self.update_status("processing", "Searching web for latest information", 5)
             try:
-                web_content = await self.web_search_agent.generate_content(topic, language=lang_info['code'])
+                web_content = await self.web_search_agent.generate_content(
+                    topic, language=lang_info['code'], mode=search_mode
+                )
                 logger.info("Web search completed successfully")
                 
                 # Creiamo un prompt che include le informazioni dalla ricerca web
@@ -120,18 +346,23 @@ class VideoGenerator:
             except Exception as e:
                 logger.warning(f"Web search failed, falling back to standard generation: {str(e)}")
                 prompt = f"Write about: {topic}"
-            
-            # Create the chat completion
-            response = await self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            essay = response.choices[0].message.content.strip()
+                # A fallback essay must not be served later as a web-search essay
+                if use_web_search:
+                    cache_inputs = None
+            
+            messages = [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ]
+            if on_sentence:
+                essay = await self.stream_essay(model, messages, lang_info['name'], on_sentence)
+            else:
+                # Create the chat completion
+                response = await self.client.chat.completions.create(model=model, messages=messages)
+                essay = response.choices[0].message.content.strip()
             logger.info("Essay generated successfully")
+            if self.cache and cache_inputs:
+                self.cache.put_json("essay", cache_inputs, essay)
             return essay
             
         except Exception as e:
@@ -147,73 +378,205 @@ class VideoGenerator:
         }
         return word_counts[length_option]
 
-    async def generate_image_prompts(self, essay, num_images, language):
-        """Generate image prompts from the essay text."""
+    async def generate_image_prompt(self, portion, language_info):
+        """Generate a single image prompt for a text portion."""
+        prompt_response = await self.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": f"You are a helpful assistant that creates detailed image prompts in {language_info['openai']} based on text descriptions. Create a vivid and specific image prompt that captures the main visual elements of the text."},
+                {"role": "user", "content": portion}
+            ]
+        )
+        return prompt_response.choices[0].message.content.strip()
+
+    async def generate_image_prompts_batch(self, text_portions, language_info):
+        """Generate one image prompt per text portion with a single structured call."""
+        numbered_portions = "\n\n".join(
+            f"TEXT {i + 1}: {portion}" for i, portion in enumerate(text_portions)
+        )
+        prompt_response = await self.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": f"""You are a helpful assistant that creates detailed image prompts in {language_info['openai']} based on text descriptions.
+                For each numbered text you receive, create a vivid and specific image prompt that captures the main visual elements of that text.
+                Answer with a JSON object of the form {{"prompts": ["<prompt for TEXT 1>", "<prompt for TEXT 2>", ...]}}
+                containing exactly {len(text_portions)} prompts, in the same order as the texts."""},
+                {"role": "user", "content": numbered_portions}
+            ]
+        )
+        content = prompt_response.choices[0].message.content
+        return parse_image_prompts(content, len(text_portions))
+
+    async def generate_image_prompts_streamed(self, sentences, num_images, language_info, expected_words, on_prompt=None):
+        """Request one prompt per text portion as soon as the streamed essay has written it.
+
+        Portions are cut by a PortionCutter (core/streaming.py) while the sentences
+        arrive and their prompts are requested concurrently. Returns
+        (prompt, position) pairs once the essay is complete.
+        """
+        cutter = PortionCutter(num_images, expected_words)
+        requests = []
+
+        async def request_prompt(index, portion):
+            prompt = await self.generate_image_prompt(portion, language_info)
+            if on_prompt:
+                on_prompt(index, prompt)
+            return prompt
+
         try:
-            logger.info(f"Generating {num_images} image prompts...")
+            async for sentence in sentences:
+                for index, portion in cutter.add(sentence):
+                    logger.info(f"Text portion {index + 1}/{num_images} ready while the essay is being written")
+                    requests.append(asyncio.ensure_future(request_prompt(index, portion)))
+            for index, portion in cutter.finish():
+                requests.append(asyncio.ensure_future(request_prompt(index, portion)))
+            prompts = await asyncio.gather(*requests)
+        except BaseException:
+            for request in requests:
+                request.cancel()
+            raise
+
+        return list(zip(prompts, cutter.positions()))
+
+    async def generate_image_prompts(self, essay, num_images, language, prompt_mode=None, on_prompt=None, expected_words=None):
+        """Generate image prompts from the essay text.
+
+        prompt_mode selects how the per-portion prompts are requested:
+        "sequential" (one call after the other), "concurrent" (all calls at once)
+        or "batch" (a single JSON call, falling back to "concurrent" if the reply
+        does not contain exactly num_images prompts).
+
+        essay may also be the ItemStream of sentences of an essay still being
+        written (see core/streaming.py). In "concurrent" mode the portions are
+        then cut, and their prompts requested, as the sentences arrive, aiming at
+        expected_words words in total; the other modes, and essays that were not
+        streamed (e.g. loaded from the cache), wait for the whole essay.
+        on_prompt(index, prompt) is called for each prompt as soon as it is ready.
+        """
+        try:
+            prompt_mode = prompt_mode or PROMPT_MODE
+            if prompt_mode not in PROMPT_MODES:
+                raise ValueError(f"Unsupported prompt mode: {prompt_mode}")
+
+            logger.info(f"Generating {num_images} image prompts ({prompt_mode})...")
             
             language_info = self.detect_language(language)
             
-            # Split essay into sentences
-            sentences = sent_tokenize(essay)
-            
-            # Create exactly num_images portions by splitting the essay text
-            text_portions = []
-            total_length = len(essay)
-            chunk_size = total_length // num_images
-            
-            current_pos = 0
-            for i in range(num_images):
-                if i == num_images - 1:
-                    # Last portion gets the remainder
-                    portion = essay[current_pos:]
-                else:
-                    # Find the next sentence boundary after chunk_size characters
-                    end_pos = min(current_pos + chunk_size, total_length)
-                    while end_pos < total_length and essay[end_pos] not in '.!?':
-                        end_pos += 1
-                    end_pos = min(end_pos + 1, total_length)
-                    
-                    portion = essay[current_pos:end_pos]
-                    current_pos = end_pos
-                
-                if portion.strip():
-                    text_portions.append(portion.strip())
-            
-            # Ensure we have exactly num_images portions
-            while len(text_portions) < num_images:
-                # If we have too few portions, duplicate the last one
-                text_portions.append(text_portions[-1])
-            
-            # Generate image prompts for each portion
-            prompts = []
-            positions = []
-            
-            for i, portion in enumerate(text_portions[:num_images]):  # Limit to num_images
-                logger.info(f"Generating prompt {i+1}/{num_images}")
-                prompt_response = await self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": f"You are a helpful assistant that creates detailed image prompts in {language_info['openai']} based on text descriptions. Create a vivid and specific image prompt that captures the main visual elements of the text."},
-                        {"role": "user", "content": portion}
-                    ]
-                )
-                
-                prompt = prompt_response.choices[0].message.content.strip()
-                prompts.append(prompt)
-                positions.append(i / (num_images - 1) if num_images > 1 else 0.5)
+            sentences = None
+            if isinstance(essay, ItemStream):
+                if prompt_mode == "concurrent" and expected_words and await essay.started():
+                    result = await self.generate_image_prompts_streamed(
+                        essay, num_images, language_info, expected_words, on_prompt
+                    )
+                    essay = await essay.wait_closed()
+                    if self.cache:
+                        self.cache.put_json("prompts", self.prompt_cache_inputs(essay, num_images, language_info), result)
+                    logger.info(f"Generated {len(result)} image prompts while streaming the essay")
+                    return result
+                # The other modes need the whole essay
+                await essay.wait_closed()
+                sentences = list(essay.items) or None
+                essay = essay.result
+            
+            # The prompts do not depend on the mode used to request them
+            cache_inputs = self.prompt_cache_inputs(essay, num_images, language_info)
+            if self.cache:
+                cached = self.cache.get_json("prompts", cache_inputs)
+                if cached is not None:
+                    logger.info("Image prompts loaded from cache")
+                    result = [tuple(item) for item in cached]
+                    if on_prompt:
+                        for index, (prompt, _) in enumerate(result):
+                            on_prompt(index, prompt)
+                    return result
+            
+            # Portions follow the sentences the narration is synthesized from, and each
+            # position is where its portion starts in the text (see core/timeline.py)
+            if sentences is None:
+                sentences = split_sentences(essay, language_info['name'])
+            portions = split_portions(sentences, num_images)
+            text_portions = [text for text, _ in portions]
+            
+            prompts = None
+            if prompt_mode == "batch":
+                try:
+                    prompts = await self.generate_image_prompts_batch(text_portions, language_info)
+                except ValueError as e:
+                    logger.warning(f"Batched prompt reply rejected, falling back to concurrent calls: {str(e)}")
+                    prompt_mode = "concurrent"
+
+            if prompt_mode == "concurrent":
+                prompts = list(await asyncio.gather(
+                    *(self.generate_image_prompt(portion, language_info) for portion in text_portions)
+                ))
+            elif prompt_mode == "sequential":
+                prompts = []
+                for i, portion in enumerate(text_portions):
+                    logger.info(f"Generating prompt {i+1}/{num_images}")
+                    prompts.append(await self.generate_image_prompt(portion, language_info))
+            
+            positions = [position for _, position in portions]
             
             logger.info(f"Generated {len(prompts)} image prompts")
             result = list(zip(prompts[:num_images], positions[:num_images]))  # Ensure exactly num_images results
             logger.info(f"Returning {len(result)} prompts with positions")
+            if self.cache:
+                self.cache.put_json("prompts", cache_inputs, result)
+            if on_prompt:
+                for index, (prompt, _) in enumerate(result):
+                    on_prompt(index, prompt)
             return result
             
         except Exception as e:
             logger.error(f"Error generating image prompts: {str(e)}")
             raise
 
-    async def generate_speech(self, text, language, output_dir):
-        """Convert text to speech using gTTS."""
+    def prompt_cache_inputs(self, essay, num_images, language_info):
+        return {
+            "essay": normalize_text(essay),
+            "num_images": num_images,
+            "language": language_info['code'],
+            "model": "gpt-3.5-turbo",
+            "portions": "sentences"
+        }
+
+    async def synthesize_sentence(self, backend, sentence, language_code, path):
+        """Synthesize one sentence in the speech thread pool, retrying on failure."""
+        def synthesize():
+            backend.synthesize(sentence, language_code, path)
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(TTS_MAX_RETRIES + 1):
+            try:
+                await loop.run_in_executor(_tts_executor, synthesize)
+                return path
+            except Exception as e:
+                if attempt == TTS_MAX_RETRIES:
+                    raise
+                logger.warning(f"Speech for a sentence failed (attempt {attempt + 1}), retrying: {str(e)}")
+                await asyncio.sleep(2 ** attempt)
+
+    async def generate_speech(self, text, language, output_dir, tts_backend=None, scratch_dir=None):
+        """Convert text to speech with the TTS backend (default: TTS_BACKEND, see core/tts.py).
+
+        The text is split into sentences that are synthesized concurrently (at most
+        TTS_CONCURRENCY at a time, each retried on failure) and joined frame by frame
+        into one MP3. Returns (speech_file, timings) where timings lists each
+        sentence with its start and end in seconds; they are also written to
+        speech_timings.json.
+
+        text may also be the ItemStream of sentences of an essay still being
+        written (see core/streaming.py): each sentence is then synthesized as soon
+        as it arrives. The cache is only looked up for complete texts.
+
+        The per-sentence files go in scratch_dir, the task's scratch directory
+        (default: one of its own for this call), never next to the output.
+        """
+        if scratch_dir is None:
+            with task_scratch_dir(self.task_id, output_dir) as scratch_dir:
+                return await self.generate_speech(text, language, output_dir, tts_backend, scratch_dir)
+
         try:
             logger.info("Converting text to speech...")
             
@@ -222,17 +585,74 @@ class VideoGenerator:
                 raise ValueError(f"Unsupported language: {language}")
             
             speech_file = os.path.join(output_dir, "speech.mp3")
+            timings_file = os.path.join(output_dir, "speech_timings.json")
             
-            # Create speech in a separate thread to not block the event loop
-            def generate_speech():
-                tts = gTTS(text=text, lang=language_info['code'])
-                tts.save(speech_file)
+            backend = get_tts_backend(tts_backend)
             
-            # Run the speech generation in a thread pool
-            await asyncio.get_event_loop().run_in_executor(None, generate_speech)
+            def speech_cache_inputs(text):
+                return {"text": normalize_text(text), "language": language_info['code'],
+                        "engine": backend.voice_id(language_info['code']), "chunking": "sentence"}
+            
+            streamed = isinstance(text, ItemStream)
+            if streamed and not await text.started():
+                # The essay was not streamed (e.g. it came from the cache)
+                text = await text.wait_closed()
+                streamed = False
+            
+            if streamed:
+                sentence_source = text
+            else:
+                cache_inputs = speech_cache_inputs(text)
+                if self.cache:
+                    timings = self.cache.get_json("speech_timings", cache_inputs)
+                    if timings is not None and await asyncio.to_thread(
+                        self.cache.get_file, "speech", cache_inputs, speech_file
+                    ):
+                        logger.info(f"Speech loaded from cache to {speech_file}")
+                        with open(timings_file, 'w') as f:
+                            json.dump(timings, f, ensure_ascii=False)
+                        return speech_file, timings
+                sentence_source = iterate_items(split_sentences(text, language_info['name']))
+            
+            # Each sentence goes to its own file, then the files are joined in order
+            semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+            parts_dir = os.path.join(scratch_dir, "speech")
+            os.makedirs(parts_dir, exist_ok=True)
+            
+            async def synthesize(index, sentence):
+                async with semaphore:
+                    return await self.synthesize_sentence(
+                        backend, sentence, language_info['code'], os.path.join(parts_dir, f"sentence_{index:04d}.mp3")
+                    )
+            
+            sentences = []
+            syntheses = []
+            try:
+                async for sentence in sentence_source:
+                    syntheses.append(asyncio.ensure_future(synthesize(len(sentences), sentence)))
+                    sentences.append(sentence)
+                logger.info(f"Synthesizing {len(sentences)} sentences")
+                part_paths = await asyncio.gather(*syntheses)
+                durations = await asyncio.to_thread(concat_mp3, part_paths, speech_file)
+            except BaseException:
+                for synthesis in syntheses:
+                    synthesis.cancel()
+                raise
+            finally:
+                shutil.rmtree(parts_dir, ignore_errors=True)
+            
+            timings = sentence_timings(sentences, durations)
+            with open(timings_file, 'w') as f:
+                json.dump(timings, f, ensure_ascii=False)
+            
+            if self.cache:
+                if streamed:
+                    cache_inputs = speech_cache_inputs(await text.wait_closed())
+                await asyncio.to_thread(self.cache.put_file, "speech", cache_inputs, speech_file)
+                self.cache.put_json("speech_timings", cache_inputs, timings)
             
             logger.info(f"Speech saved to {speech_file}")
-            return speech_file
+            return speech_file, timings
             
         except Exception as e:
             logger.error(f"Error generating speech: {str(e)}")
@@ -247,131 +667,270 @@ class VideoGenerator:
         }
         
         model = models[image_model_option]
+        image_path = os.path.join(output_dir, f'image_{index}.png')
+        
+        cache_inputs = {"prompt": normalize_text(description), "model": model, "size": "1024x1024"}
+        if self.cache and await asyncio.to_thread(self.cache.get_file, "image", cache_inputs, image_path):
+            logger.info(f"Image loaded from cache to {image_path}")
+            return image_path
+        
         logger.info(f"Using {model} to generate image...")
         
         response = await self.client.images.generate(
             model=model,
             prompt=description,
             n=1,
-            size="1024x1024"
+            size="1024x1024",
+            response_format=IMAGE_RESPONSE_FORMAT
         )
         
-        image_url = response.data[0].url
-        image_path = os.path.join(output_dir, f'image_{index}.png')
+        if IMAGE_RESPONSE_FORMAT == "b64_json":
+            # The image comes inline: no second request to fetch it
+            await write_b64_image(response.data[0].b64_json, image_path)
+        else:
+            await download_image(get_http_session(), response.data[0].url, image_path)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as resp:
-                if resp.status == 200:
-                    with open(image_path, 'wb') as f:
-                        f.write(await resp.read())
+        if self.cache:
+            await asyncio.to_thread(self.cache.put_file, "image", cache_inputs, image_path)
         
         logger.info(f"Saved image to {image_path}")
         return image_path
 
-    def create_video(self, image_paths_with_positions, audio_path, output_path):
-        logger.info("Creating video...")
-        
-        # Load audio and get duration
-        audio = AudioFileClip(audio_path)
-        total_duration = audio.duration
-        
-        # Sort images by their position
-        image_paths_with_positions.sort(key=lambda x: x[1])
-        
-        # Create video clips
-        clips = []
-        for i, (img_path, position) in enumerate(image_paths_with_positions):
-            start_time = position * total_duration
-            
-            # Calculate end time (either next image position or end of audio)
-            if i < len(image_paths_with_positions) - 1:
-                end_time = image_paths_with_positions[i + 1][1] * total_duration
+    async def generate_images(self, prompts, image_model_option, output_dir, total_images=None):
+        """Generate all images concurrently, bounded per task and across the process.
+
+        prompts is a list of (index, prompt) pairs, or an ItemStream of them
+        (see core/streaming.py) whose images are started as the prompts arrive;
+        total_images is the number expected and drives the progress updates.
+        Returns (index, image_path) pairs in index order.
+
+        Each image is retried up to IMAGE_MAX_RETRIES times. Images that still fail are
+        recorded in the task's ``failed_images`` list and skipped, so the video is built
+        from the ones that succeeded; the call only fails if no image could be generated.
+        """
+        total_images = total_images or len(prompts)
+        task_semaphore = asyncio.Semaphore(self.image_concurrency)
+        process_semaphore = get_image_semaphore()
+        completed = 0
+
+        async def generate_one(index, prompt):
+            nonlocal completed
+            for attempt in range(IMAGE_MAX_RETRIES + 1):
+                try:
+                    async with task_semaphore, process_semaphore:
+                        image_path = await self.generate_image(prompt, index, image_model_option, output_dir)
+                    break
+                except Exception as e:
+                    if attempt == IMAGE_MAX_RETRIES:
+                        raise
+                    logger.warning(f"Image {index + 1} failed (attempt {attempt + 1}), retrying: {str(e)}")
+                    await asyncio.sleep(2 ** attempt)
+
+            completed += 1
+            self.update_status("processing", f"Generated image {completed} of {total_images}",
+                               40 + (40 * completed / total_images))
+            return image_path
+
+        source = prompts if isinstance(prompts, ItemStream) else iterate_items(prompts)
+        requested = []
+        generations = []
+        try:
+            async for index, prompt in source:
+                requested.append((index, prompt))
+                generations.append(asyncio.ensure_future(generate_one(index, prompt)))
+            results = await asyncio.gather(*generations, return_exceptions=True)
+        except BaseException:
+            for generation in generations:
+                generation.cancel()
+            raise
+
+        image_paths = []
+        failed_images = []
+        for (index, prompt), result in sorted(zip(requested, results), key=lambda item: item[0][0]):
+            # A generation cancelled on its own comes back as a CancelledError, which is not an Exception
+            if isinstance(result, BaseException):
+                error = str(result) or type(result).__name__
+                logger.error(f"Image {index + 1} failed after {IMAGE_MAX_RETRIES + 1} attempts: {error}")
+                failed_images.append({"index": index, "prompt": prompt, "error": error})
             else:
-                end_time = total_duration
-            
-            duration = end_time - start_time
-            
-            # Create image clip with proper duration and timing
-            clip = (ImageClip(img_path)
-                   .set_duration(duration)
-                   .set_start(start_time)
-                   .set_position('center'))
-            clips.append(clip)
-        
-        # Create video with all clips
-        video = CompositeVideoClip(clips, size=(1024, 1024))
-        
-        # Set the duration to match the audio
-        video = video.set_duration(total_duration)
-        
-        # Add audio to video
-        final_video = video.set_audio(audio)
-        
-        # Write video file with audio
-        final_video.write_videofile(
-            output_path,
-            fps=24,
-            codec='libx264',
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True
+                image_paths.append((index, result))
+
+        if failed_images:
+            self.tasks.update(self.task_id, {"failed_images": failed_images})
+        if not image_paths:
+            raise RuntimeError(f"All {total_images} image generations failed")
+
+        return image_paths
+
+    async def prepare_frames(self, image_paths, frames_dir):
+        """Turn images into frames at VIDEO_RESOLUTION for the renderer (see core/frames.py), in threads.
+
+        Returns a dict of image path to frame path.
+        """
+        pixel_format = frame_format()
+        frame_paths = await asyncio.gather(*(
+            asyncio.to_thread(prepare_frame, image_path, frames_dir, pixel_format=pixel_format)
+            for image_path in image_paths
+        ))
+        logger.info(f"Prepared {len(frame_paths)} frames at {VIDEO_SIZE[0]}x{VIDEO_SIZE[1]}")
+        return dict(zip(image_paths, frame_paths))
+
+    async def create_video(self, timeline, audio_path, output_path, hls_dir=None, render_profile=None):
+        """Render the video in the render process pool, reporting progress to the task.
+
+        render_profile names the encoder settings (see core/profiles.py, default:
+        RENDER_PROFILE). With hls_dir, the task's ``playlist_url`` is set as soon as the HLS playlist
+        exists, so clients can start playback before the render completes.
+        """
+        if self.tasks.get(self.task_id).get("cancel_requested"):
+            raise RenderCancelled("Task cancelled before rendering")
+
+        playlist_announced = False
+
+        def announce_playlist():
+            nonlocal playlist_announced
+            if hls_dir and not playlist_announced and os.path.exists(os.path.join(hls_dir, HLS_PLAYLIST_NAME)):
+                self.tasks.update(self.task_id, {"playlist_url": f"/hls/{self.task_id}/{HLS_PLAYLIST_NAME}"})
+                playlist_announced = True
+
+        def on_progress(fraction):
+            announce_playlist()
+            self.update_status("processing", f"Creating video ({fraction:.0%})", 80 + 10 * fraction)
+
+        result = await render_pool.render(
+            self.task_id, timeline, audio_path, output_path, on_progress=on_progress,
+            hls_dir=hls_dir, profile=get_render_profile(render_profile)
         )
-        
-        logger.info(f"Video saved to {output_path}")
-        return output_path
+        announce_playlist()
+        return result
+
+    def record_stage(self, stage, status):
+        """Record the status and start/end times of a pipeline stage in the task."""
+        stages = self.tasks.get(self.task_id).get("stages") or {}
+        record = stages.setdefault(stage, {})
+        now = datetime.now()
+        record["status"] = status
+        if status == "running":
+            record["started_at"] = now.isoformat()
+        else:
+            record["finished_at"] = now.isoformat()
+            started_at = datetime.fromisoformat(record["started_at"])
+            record["duration"] = (now - started_at).total_seconds()
+        self.tasks.update(self.task_id, {"stages": stages})
 
-    async def generate(self, topic, num_images, language, text_model, image_model, video_length, output_dir, use_web_search=True):
-        """Main generation method that coordinates the entire process."""
+    async def generate(self, topic, num_images, language, text_model, image_model, video_length, output_dir, use_web_search=True, prompt_mode=None, search_mode=None, output_format=None, tts_backend=None, render_profile=None):
+        """Main generation method that coordinates the entire process.
+
+        The work runs as a dependency graph: speech synthesis only needs the
+        essay, so it overlaps with prompt and image generation. With
+        ESSAY_STREAMING the essay's sentences are passed on while it is being
+        written, so speech synthesis and the first image prompts and images start
+        before it is complete.
+        """
         try:
+            # An unknown render profile fails before any paid API call
+            get_render_profile(render_profile)
             self.update_status("processing", "Generating essay", 0)
-            
-            # Disabilita temporaneamente l'agente di ricerca web se richiesto
-            original_web_search_agent = self.web_search_agent
-            if not use_web_search:
-                logger.info("Web search disabled for this request")
-                self.web_search_agent = None
-            
-            try:
-                # Generate essay
-                essay = await self.generate_essay(topic, video_length, text_model, language)
-            finally:
-                # Ripristina l'agente di ricerca web
+
+            # Sentences of the essay as they are written, and image prompts as they are ready
+            sentences = ItemStream()
+            prompt_stream = ItemStream()
+
+            async def essay_stage():
+                # Disabilita temporaneamente l'agente di ricerca web se richiesto
+                original_web_search_agent = self.web_search_agent
                 if not use_web_search:
-                    self.web_search_agent = original_web_search_agent
-            
-            self.update_status("processing", "Generating image prompts", 20)
-            
-            # Generate image prompts
-            prompts_with_positions = await self.generate_image_prompts(essay, num_images, language)
-            
-            # Generate speech
-            self.update_status("processing", "Converting text to speech", 40)
-            speech_file = await self.generate_speech(essay, language, output_dir)
-            
-            # Generate images
-            self.update_status("processing", "Generating images", 60)
-            image_paths_with_positions = []
-            total_images = len(prompts_with_positions)
-            
-            for index, (prompt, position) in enumerate(prompts_with_positions):
-                self.update_status("processing", f"Generating image {index + 1} of {total_images}", 
-                                 60 + (20 * (index + 1) / total_images))
-                image_path = await self.generate_image(prompt, index, image_model, output_dir)
-                image_paths_with_positions.append((image_path, position))
-            
-            # Create video
-            self.update_status("processing", "Creating video", 80)
-            output_video = os.path.join(output_dir, "output.mp4")
-            self.create_video(image_paths_with_positions, speech_file, output_video)
-            
-            # Move video to final location
-            self.update_status("processing", "Finalizing video", 90)
-            final_output = os.path.join(output_dir, f"{self.task_id}.mp4")
-            shutil.move(output_video, final_output)
+                    logger.info("Web search disabled for this request")
+                    self.web_search_agent = None
+                
+                try:
+                    essay = await self.generate_essay(
+                        topic, video_length, text_model, language, search_mode,
+                        on_sentence=sentences.put if ESSAY_STREAMING else None
+                    )
+                except Exception as e:
+                    sentences.fail(e)
+                    raise
+                finally:
+                    # Ripristina l'agente di ricerca web
+                    if not use_web_search:
+                        self.web_search_agent = original_web_search_agent
+                sentences.close(essay)
+                return essay
+
+            async def prompts_stage():
+                await sentences.started()
+                self.update_status("processing", "Generating image prompts", 20)
+                try:
+                    prompts = await self.generate_image_prompts(
+                        sentences, num_images, language, prompt_mode,
+                        on_prompt=lambda index, prompt: prompt_stream.put((index, prompt)),
+                        expected_words=self.get_word_count(video_length)
+                    )
+                except Exception as e:
+                    prompt_stream.fail(e)
+                    raise
+                prompt_stream.close()
+                return prompts
+
+            async def speech_stage():
+                return await self.generate_speech(sentences, language, output_dir, tts_backend, scratch_dir)
+
+            async def images_stage():
+                await prompt_stream.started()
+                self.update_status("processing", "Generating images", 40)
+                return await self.generate_images(prompt_stream, image_model, output_dir, total_images=num_images)
+
+            async def frames_stage(images):
+                # Decoded and scaled once here, while the narration may still be synthesized
+                return await self.prepare_frames([image_path for _, image_path in images], frames_dir)
+
+            async def video_stage(prompts, images, speech, frames):
+                speech_file, timings = speech
+                images = [(image_path, prompts[index][1]) for index, image_path in images]
+                # Each image starts when the narration reaches its text portion
+                timeline = build_timeline(images, timings)
+                with open(os.path.join(output_dir, "timeline.json"), 'w') as f:
+                    json.dump(timeline.to_list(), f)
+                self.update_status("processing", "Creating video", 80)
+                hls_dir = os.path.join(output_dir, "hls") if (output_format or OUTPUT_FORMAT) == "hls" else None
+                output_video = os.path.join(scratch_dir, "output.mp4")
+                await self.create_video(timeline.with_images(frames), speech_file, output_video, hls_dir=hls_dir,
+                                        render_profile=render_profile)
+                
+                # Move video to final location
+                self.update_status("processing", "Finalizing video", 90)
+                final_output = os.path.join(output_dir, f"{self.task_id}.mp4")
+                await asyncio.to_thread(publish_file, output_video, final_output)
+                return final_output
+
+            pipeline = Pipeline(
+                [
+                    # Prompts, speech and images read the streams, so they do not wait for the essay
+                    Stage("essay", essay_stage),
+                    Stage("prompts", prompts_stage),
+                    Stage("speech", speech_stage),
+                    Stage("images", images_stage),
+                    Stage("frames", frames_stage, depends_on=["images"]),
+                    Stage("video", video_stage, depends_on=["prompts", "images", "speech", "frames"]),
+                ],
+                on_stage_start=lambda stage: self.record_stage(stage, "running"),
+                on_stage_end=self.record_stage
+            )
+            # Intermediate files (speech parts, frames, render output) stay in the task's scratch directory
+            # until the video is complete
+            with task_scratch_dir(self.task_id, output_dir) as scratch_dir:
+                frames_dir = os.path.join(scratch_dir, "frames")
+                results = await pipeline.run()
             
             self.update_status("completed", "Video generation completed", 100)
-            return final_output
+            return results["video"]
             
+        except RenderCancelled:
+            self.update_status("cancelled", "Video generation cancelled", self.tasks.get(self.task_id).get("progress", 0))
+            logger.info(f"Task {self.task_id} cancelled")
+            return None
+
         except Exception as e:
             self.update_status("failed", "Error occurred", 0, str(e))
             logger.error(f"Error generating video: {str(e)}")
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by the API (which enqueues) and the workers (which claim)
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join("output", "jobs.db"))
+# Seconds a running job keeps its claim without a heartbeat from its worker;
+# after that it is considered interrupted (crash, restart) and requeued
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '120'))
+
+class JobQueue:
+    """
+    Local job queue stored in SQLite.
+
+    Jobs are claimed atomically by the highest priority first and, within the
+    same priority, in the order they were enqueued. The job id is the task id.
+
+    A claimed job is leased: its worker renews the lease with heartbeat(), and
+    requeue_stale() puts running jobs whose lease expired back in the queue.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _init_schema(self):
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                priority INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, enqueued_at);
+        """)
+        # Queues created before batches and leases existed lack these columns
+        columns = [row[1] for row in self._connection().execute("PRAGMA table_info(jobs)")]
+        if "batch_id" not in columns:
+            self._connection().execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+        if "heartbeat_at" not in columns:
+            self._connection().execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id)")
+
+    def enqueue(self, job_id, payload, priority=0, batch_id=None):
+        self._connection().execute(
+            "INSERT INTO jobs (job_id, priority, payload, status, enqueued_at, batch_id) "
+            "VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, priority, json.dumps(payload), time.time(), batch_id)
+        )
+        logger.info(f"Job {job_id} enqueued with priority {priority}")
+
+    def enqueue_many(self, jobs, priority=0, batch_id=None):
+        """Enqueue (job_id, payload) pairs in a single transaction."""
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO jobs (job_id, priority, payload, status, enqueued_at, batch_id) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                # Increasing timestamps keep the submission order within the batch
+                [(job_id, priority, json.dumps(payload), now + i * 1e-6, batch_id)
+                 for i, (job_id, payload) in enumerate(jobs)]
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        logger.info(f"{len(jobs)} jobs enqueued with priority {priority}" + (f" in batch {batch_id}" if batch_id else ""))
+
+    def batch_jobs(self, batch_id):
+        """Return (job_id, status) pairs of a batch in submission order."""
+        return self._connection().execute(
+            "SELECT job_id, status FROM jobs WHERE batch_id = ? ORDER BY enqueued_at", (batch_id,)
+        ).fetchall()
+
+    def claim(self, worker_id):
+        """Claim the next queued job for worker_id. Returns (job_id, payload) or None."""
+        connection = self._connection()
+        # BEGIN IMMEDIATE takes the write lock so two workers cannot claim the same job
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT job_id, payload FROM jobs WHERE status = 'queued' "
+                "ORDER BY priority DESC, enqueued_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, worker_id = ? "
+                    "WHERE job_id = ?",
+                    (now, now, worker_id, row[0])
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def finish(self, job_id, status="done"):
+        """Mark a claimed job as done, failed or cancelled."""
+        # The payload is dropped once the job is over: it may hold the caller's OpenAI key
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, payload = '{}' WHERE job_id = ?",
+            (status, time.time(), job_id)
+        )
+
+    def cancel(self, job_id):
+        """Cancel a job that has not been claimed yet. Returns False if it is already running or finished."""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, payload = '{}' "
+            "WHERE job_id = ? AND status = 'queued'",
+            (time.time(), job_id)
+        )
+        return cursor.rowcount > 0
+
+    def heartbeat(self, worker_id, job_ids):
+        """Renew the lease of the jobs worker_id is running."""
+        if not job_ids:
+            return
+        placeholders = ", ".join("?" for _ in job_ids)
+        self._connection().execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker_id = ? "
+            f"AND job_id IN ({placeholders})",
+            (time.time(), worker_id, *job_ids)
+        )
+
+    def requeue(self, job_id):
+        """Put a running job back in the queue (e.g. when its worker shuts down before it finishes)."""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL, worker_id = NULL "
+            "WHERE job_id = ? AND status = 'running'",
+            (job_id,)
+        )
+        return cursor.rowcount > 0
+
+    def _requeue_where(self, condition, params):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            job_ids = [row[0] for row in connection.execute(
+                f"SELECT job_id FROM jobs WHERE status = 'running' AND {condition}", params
+            )]
+            connection.executemany(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL, worker_id = NULL "
+                "WHERE job_id = ?",
+                [(job_id,) for job_id in job_ids]
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return job_ids
+
+    def release(self, worker_id):
+        """Put the jobs still running on worker_id back in the queue (e.g. after a restart); returns their ids."""
+        return self._requeue_where("worker_id = ?", (worker_id,))
+
+    def requeue_stale(self, lease_seconds=JOB_LEASE_SECONDS):
+        """Put running jobs whose lease expired back in the queue (their worker died); returns their ids."""
+        cutoff = time.time() - lease_seconds
+        return self._requeue_where("COALESCE(heartbeat_at, started_at) < ?", (cutoff,))
+
+    def position(self, job_id):
+        """Return the 1-based position of a queued job, or None if it is not waiting."""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT priority, enqueued_at FROM jobs WHERE job_id = ? AND status = 'queued'", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        priority, enqueued_at = row
+        ahead = connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' "
+            "AND (priority > ? OR (priority = ? AND enqueued_at < ?))",
+            (priority, priority, enqueued_at)
+        ).fetchone()[0]
+        return ahead + 1
+
+    def counts(self):
+        """Return the number of jobs per status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
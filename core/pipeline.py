@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """
+    A single step of the generation pipeline.
+
+    The stage function is a coroutine called with one keyword argument per
+    dependency, named after the dependency and holding its result.
+    """
+
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+class Pipeline:
+    """
+    Runs a small dependency graph of stages, starting each stage as soon as
+    all of its dependencies have finished.
+    """
+
+    def __init__(self, stages, on_stage_start=None, on_stage_end=None):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+
+        for stage in self.stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+
+        self.order = self._topological_order()
+        self.on_stage_start = on_stage_start
+        self.on_stage_end = on_stage_end
+
+    def _topological_order(self):
+        """Return the stage names in dependency order, rejecting cycles."""
+        order = []
+        visiting = set()
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle detected at stage '{name}'")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.remove(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    async def _run_stage(self, stage, tasks):
+        inputs = {}
+        for dependency in stage.depends_on:
+            inputs[dependency] = await tasks[dependency]
+
+        if self.on_stage_start:
+            self.on_stage_start(stage.name)
+        logger.info(f"Stage '{stage.name}' started")
+
+        try:
+            result = await stage.func(**inputs)
+        except asyncio.CancelledError:
+            if self.on_stage_end:
+                self.on_stage_end(stage.name, "cancelled")
+            raise
+        except Exception:
+            if self.on_stage_end:
+                self.on_stage_end(stage.name, "failed")
+            raise
+
+        if self.on_stage_end:
+            self.on_stage_end(stage.name, "completed")
+        logger.info(f"Stage '{stage.name}' completed")
+        return result
+
+    async def run(self):
+        """
+        Run every stage and return a dict of stage name to result.
+
+        If a stage fails, the stages still running are cancelled and the
+        original exception is raised.
+        """
+        tasks = {}
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(self._run_stage(self.stages[name], tasks))
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,114 @@
+import os
+import json
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Audio formats that can be muxed into MP4 without re-encoding
+COPYABLE_AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac')
+
+X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+X264_TUNES = ("film", "animation", "grain", "stillimage", "fastdecode", "zerolatency")
+
+class RenderProfile:
+    """
+    Encoder settings of a render.
+
+    fps: output frame rate; None lets the renderer choose (one frame per still
+        for the slideshow renderer, 24 for moviepy, HLS_FPS for HLS output)
+    preset, tune, crf: libx264 speed/compression trade-off, tuning and quality
+        (lower crf is better quality and larger files)
+    threads: encoder threads, 0 for ffmpeg's automatic choice
+    audio_bitrate: e.g. "128k" to encode the narration to AAC at that rate;
+        None copies it unchanged when the container allows it
+    """
+
+    FIELDS = ("fps", "preset", "tune", "crf", "threads", "audio_bitrate")
+
+    def __init__(self, name, fps=None, preset="veryfast", tune="stillimage", crf=23, threads=0, audio_bitrate=None):
+        if fps is not None and not 0 < fps <= 60:
+            raise ValueError(f"Render profile {name}: fps must be between 1 and 60")
+        if preset not in X264_PRESETS:
+            raise ValueError(f"Render profile {name}: preset must be one of {', '.join(X264_PRESETS)}")
+        if tune is not None and tune not in X264_TUNES:
+            raise ValueError(f"Render profile {name}: tune must be one of {', '.join(X264_TUNES)}")
+        if not 0 <= crf <= 51:
+            raise ValueError(f"Render profile {name}: crf must be between 0 and 51")
+        if threads < 0:
+            raise ValueError(f"Render profile {name}: threads must be 0 (automatic) or more")
+        self.name = name
+        self.fps = fps
+        self.preset = preset
+        self.tune = tune
+        self.crf = crf
+        self.threads = threads
+        self.audio_bitrate = audio_bitrate
+
+    def video_args(self):
+        """ffmpeg output options for the libx264 video stream."""
+        args = ['-c:v', 'libx264', '-preset', self.preset, '-crf', str(self.crf)]
+        if self.tune:
+            args += ['-tune', self.tune]
+        if self.threads:
+            args += ['-threads', str(self.threads)]
+        return args
+
+    def audio_args(self, audio_path):
+        """ffmpeg output options for the audio stream of an MP4 built from audio_path."""
+        if self.audio_bitrate is None:
+            if os.path.splitext(audio_path)[1].lower() in COPYABLE_AUDIO_EXTENSIONS:
+                return ['-c:a', 'copy']
+            return ['-c:a', 'aac']
+        return ['-c:a', 'aac', '-b:a', self.audio_bitrate]
+
+    def to_dict(self):
+        return {"name": self.name, **{field: getattr(self, field) for field in self.FIELDS}}
+
+    def __repr__(self):
+        return f"RenderProfile({self.to_dict()!r})"
+
+# Built-in profiles. "standard" keeps the slideshow renderer's previous settings (veryfast,
+# stillimage, crf 23); for moviepy, which used x264's medium preset with no tune, it is faster
+_BUILTIN_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 30},
+    "standard": {},
+    "final": {"preset": "slow", "crf": 18, "audio_bitrate": "128k"},
+}
+
+def load_profiles(overrides=''):
+    """
+    Return the render profiles by name: the built-in ones updated with overrides,
+    a JSON object of profile name to settings, e.g.
+    '{"gold": {"preset": "medium", "crf": 20, "threads": 4}, "draft": {"fps": 12}}'.
+    Settings missing from a new profile take the RenderProfile defaults.
+    """
+    settings = {name: dict(values) for name, values in _BUILTIN_PROFILES.items()}
+    if overrides.strip():
+        try:
+            extra = json.loads(overrides)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid RENDER_PROFILES JSON: {str(e)}")
+        if not isinstance(extra, dict):
+            raise ValueError("RENDER_PROFILES must be a JSON object of profile name to settings")
+        for name, values in extra.items():
+            if not isinstance(values, dict):
+                raise ValueError(f"Render profile {name}: settings must be a JSON object")
+            unknown = set(values) - set(RenderProfile.FIELDS)
+            if unknown:
+                raise ValueError(f"Render profile {name}: unknown settings {', '.join(sorted(unknown))}")
+            settings.setdefault(name, {}).update(values)
+    return {name: RenderProfile(name, **values) for name, values in settings.items()}
+
+# Deployment-wide profiles (RENDER_PROFILES adds or adjusts them) and the default one
+RENDER_PROFILES = load_profiles(os.getenv('RENDER_PROFILES', ''))
+RENDER_PROFILE = os.getenv('RENDER_PROFILE', 'standard')
+
+def get_render_profile(name=None):
+    """Return a render profile by name (default: RENDER_PROFILE)."""
+    name = name or RENDER_PROFILE
+    profile = RENDER_PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown render profile: {name}")
+    return profile
@@ -0,0 +1,302 @@
+import os
+import errno
+import shutil
+import logging
+import asyncio
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from proglog import ProgressBarLogger
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of render processes; each render is CPU-bound and runs in its own process
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+# Render backend: "slideshow" (ffmpeg, one encode per still) or "moviepy" (every frame written through moviepy)
+RENDERERS = ("slideshow", "moviepy")
+RENDERER = os.getenv('RENDERER', 'slideshow')
+# Output: "mp4" only, or "hls" for an MP4 plus HLS segments viewers can watch while encoding
+OUTPUT_FORMATS = ("mp4", "hls")
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'mp4')
+# Seconds between progress reports from a running render
+RENDER_PROGRESS_INTERVAL = float(os.getenv('RENDER_PROGRESS_INTERVAL', '1.0'))
+# Where intermediate render files go (e.g. a tmpfs mount); defaults to the task's output directory
+SCRATCH_DIR = os.getenv('SCRATCH_DIR', '')
+
+# Prepared frame format each renderer reads (see core/frames.py)
+_RENDERER_FRAME_FORMATS = {"slideshow": "yuv420p", "moviepy": "rgb24"}
+
+def frame_format(renderer=None):
+    """Return the prepared frame format read by a renderer (default: RENDERER)."""
+    renderer = renderer or RENDERER
+    if renderer not in _RENDERER_FRAME_FORMATS:
+        raise ValueError(f"Unsupported renderer: {renderer}")
+    return _RENDERER_FRAME_FORMATS[renderer]
+
+@contextlib.contextmanager
+def task_scratch_dir(task_id, output_dir):
+    """Yield a directory private to the task for intermediate files, removed afterwards."""
+    path = os.path.join(SCRATCH_DIR, task_id) if SCRATCH_DIR else os.path.join(output_dir, ".scratch")
+    os.makedirs(path, exist_ok=True)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def publish_file(src_path, dest_path):
+    """Move src_path to dest_path atomically: dest_path is either absent or complete."""
+    try:
+        os.replace(src_path, dest_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # Scratch space on another filesystem: copy next to the destination, then rename
+        part_path = dest_path + ".part"
+        shutil.copyfile(src_path, part_path)
+        os.replace(part_path, dest_path)
+        os.remove(src_path)
+    return dest_path
+
+class RenderCancelled(Exception):
+    """Raised when a render is cancelled before it completes."""
+
+class RenderProgressLogger(ProgressBarLogger):
+    """
+    Proglog logger passed to moviepy that publishes the frame-writing progress
+    to a shared value and aborts the render once cancellation is requested.
+    """
+
+    def __init__(self, progress=None, cancel_event=None):
+        super().__init__()
+        self.progress = progress
+        self.cancel_event = cancel_event
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise RenderCancelled("Render cancelled")
+
+        # "t" is the video frame bar; the audio "chunk" bar is short and ignored
+        if bar == "t" and attr == "index" and self.progress is not None:
+            total = self.bars[bar].get("total")
+            if total:
+                self.progress.value = min(1.0, (value + 1) / total)
+
+def render_video(timeline, audio_path, output_path, progress=None, cancel_event=None,
+                 renderer=None, hls_dir=None, profile=None):
+    """
+    Render the video with the configured renderer.
+
+    timeline is a core.timeline.Timeline giving when each image is shown.
+    Images are first turned into frames at VIDEO_RESOLUTION (core/frames.py),
+    unless the timeline already shows frames prepared for this renderer; the
+    renderers only ever read prepared frames.
+
+    Runs inside a render worker process. progress and cancel_event are optional
+    shared objects (a float value and an event) used to report the fraction of
+    frames written and to abort the render. With hls_dir, HLS segments and a
+    playlist are written there too: while encoding by the slideshow renderer,
+    after the MP4 is complete by the moviepy renderer. profile is the
+    core.profiles.RenderProfile with the encoder settings (default: RENDER_PROFILE).
+    """
+    from core.frames import prepare_timeline_frames
+    from core.profiles import get_render_profile
+
+    renderer = renderer or RENDERER
+    profile = profile or get_render_profile()
+    frames_dir = os.path.join(os.path.dirname(os.path.abspath(output_path)), "frames")
+    # Frames prepared here (not by the caller) are removed with the render
+    own_frames = not os.path.exists(frames_dir)
+    try:
+        timeline = prepare_timeline_frames(timeline, frames_dir, pixel_format=frame_format(renderer))
+
+        if renderer == "slideshow":
+            from core.slideshow import render_slideshow
+            return render_slideshow(timeline, audio_path, output_path, progress, cancel_event,
+                                    hls_dir=hls_dir, profile=profile)
+        render_moviepy(timeline, audio_path, output_path, progress, cancel_event, profile=profile)
+        if hls_dir:
+            from core.slideshow import segment_to_hls
+            segment_to_hls(output_path, hls_dir)
+        return output_path
+    finally:
+        if own_frames:
+            shutil.rmtree(frames_dir, ignore_errors=True)
+
+def render_moviepy(timeline, audio_path, output_path, progress=None, cancel_event=None, size=None, profile=None):
+    """
+    Render the video with moviepy from rgb24 frames prepared at size (default:
+    VIDEO_RESOLUTION). The frames are memory-mapped and handed to the encoder
+    as they are: nothing is decoded, scaled or composited per frame. Encoder
+    settings come from the render profile (default: RENDER_PROFILE).
+    """
+    # Imported here so the API process does not need to load moviepy
+    from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
+    from core.frames import load_rgb_frame, VIDEO_SIZE
+    from core.profiles import get_render_profile
+
+    logger.info("Creating video...")
+    size = size or VIDEO_SIZE
+    profile = profile or get_render_profile()
+
+    # Load audio and get duration
+    audio = AudioFileClip(audio_path)
+    total_duration = audio.duration
+
+    # Create video clips, one per timeline cue (the last one ends with the audio)
+    clips = []
+    for cue in timeline.fit(total_duration).cues:
+        clips.append(ImageClip(load_rgb_frame(cue.image_path, size)).set_duration(cue.duration))
+
+    # The cues are contiguous from 0, so the clips simply follow each other
+    video = concatenate_videoclips(clips, method="chain")
+
+    # Set the duration to match the audio
+    video = video.set_duration(total_duration)
+
+    # Add audio to video
+    final_video = video.set_audio(audio)
+
+    try:
+        # Write video file with audio
+        final_video.write_videofile(
+            output_path,
+            fps=profile.fps or 24,
+            codec='libx264',
+            preset=profile.preset,
+            threads=profile.threads or None,
+            audio_codec='aac',
+            audio_bitrate=profile.audio_bitrate,
+            # Next to the output, so concurrent renders never share a temporary file
+            temp_audiofile=os.path.splitext(output_path)[0] + '-audio.m4a',
+            remove_temp=True,
+            ffmpeg_params=['-crf', str(profile.crf), '-movflags', '+faststart']
+                          + (['-tune', profile.tune] if profile.tune else []),
+            logger=RenderProgressLogger(progress, cancel_event)
+        )
+    except RenderCancelled:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    finally:
+        final_video.close()
+        audio.close()
+
+    logger.info(f"Video saved to {output_path}")
+    return output_path
+
+class RenderPool:
+    """
+    Runs renders in a dedicated process pool so the event loop (and with it the
+    API) stays responsive while moviepy and ffmpeg are encoding.
+    """
+
+    def __init__(self, max_workers=RENDER_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._manager = None
+        self._jobs = {}
+
+    def _ensure_started(self):
+        if self._executor is None:
+            # Spawn instead of fork: the parent runs an event loop and threads
+            context = multiprocessing.get_context("spawn")
+            self._manager = context.Manager()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            logger.info(f"Render pool started with {self.max_workers} workers")
+
+    def _reset(self, executor):
+        # A render process died (e.g. OOM-killed) and the executor refuses any further work:
+        # drop it so the next render starts a fresh pool. Concurrent renders in the same pool
+        # fail with it; only the first one to notice replaces the pool.
+        if self._executor is not executor:
+            return
+        logger.error("A render process died; restarting the render pool")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    async def render(self, job_id, timeline, audio_path, output_path, on_progress=None,
+                     renderer=None, hls_dir=None, profile=None):
+        """
+        Render a video in the pool and wait for it without blocking the loop.
+
+        on_progress is called from the event loop with the fraction of frames
+        written so far. Raises RenderCancelled if cancel(job_id) is called, and
+        cancels the render if the awaiting coroutine itself is cancelled. If a
+        render process dies, the renders running in the pool fail and the pool
+        is restarted for the next ones.
+        """
+        for attempt in range(2):
+            self._ensure_started()
+            executor = self._executor
+            progress = self._manager.Value('d', 0.0)
+            cancel_event = self._manager.Event()
+            try:
+                future = executor.submit(
+                    render_video, timeline, audio_path, output_path, progress, cancel_event, renderer,
+                    hls_dir, profile
+                )
+                break
+            except BrokenProcessPool:
+                # Broken before this render was even submitted: retry once in a fresh pool
+                self._reset(executor)
+                if attempt:
+                    raise
+        self._jobs[job_id] = (future, cancel_event)
+
+        try:
+            wrapped = asyncio.wrap_future(future)
+            while True:
+                done, _ = await asyncio.wait({wrapped}, timeout=RENDER_PROGRESS_INTERVAL)
+                if done:
+                    break
+                if on_progress:
+                    on_progress(progress.value)
+
+            if future.cancelled():
+                raise RenderCancelled("Render cancelled before it started")
+            return wrapped.result()
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise
+        except asyncio.CancelledError:
+            self._cancel_job(future, cancel_event)
+            raise
+        finally:
+            self._jobs.pop(job_id, None)
+
+    def _cancel_job(self, future, cancel_event):
+        # A queued render is dropped; a running one stops at the next frame
+        if not future.cancel():
+            cancel_event.set()
+
+    def cancel(self, job_id):
+        """Cancel a queued or running render. Returns False if the job is unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        self._cancel_job(*job)
+        logger.info(f"Render {job_id} cancellation requested")
+        return True
+
+    def is_rendering(self, job_id):
+        return job_id in self._jobs
+
+    def shutdown(self):
+        """Cancel pending renders and stop the worker processes."""
+        for future, cancel_event in list(self._jobs.values()):
+            self._cancel_job(future, cancel_event)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+# Process-wide render pool shared by every task
+render_pool = RenderPool()
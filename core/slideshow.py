@@ -0,0 +1,179 @@
+import os
+import shutil
+import logging
+import subprocess
+from core.profiles import get_render_profile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# HLS output: target segment length, frame rate (segments can only start on a
+# keyframe, so one frame per still is not enough) and playlist file name
+HLS_SEGMENT_SECONDS = int(os.getenv('HLS_SEGMENT_SECONDS', '4'))
+HLS_FPS = int(os.getenv('HLS_FPS', '24'))
+HLS_PLAYLIST_NAME = "index.m3u8"
+
+def hls_muxer_options(hls_dir):
+    """Return the ffmpeg HLS muxer options writing an event playlist (grows while encoding) into hls_dir."""
+    return {
+        "hls_time": str(HLS_SEGMENT_SECONDS),
+        "hls_playlist_type": "event",
+        "hls_segment_filename": os.path.join(hls_dir, "segment_%03d.ts"),
+    }
+
+def get_ffmpeg_binary():
+    """Return the ffmpeg binary moviepy is configured with (FFMPEG_BINARY or imageio-ffmpeg)."""
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+def get_media_duration(path):
+    """Return the duration in seconds of an audio or video file."""
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    return ffmpeg_parse_infos(path)['duration']
+
+def write_concat_list(image_durations, list_path):
+    """Write an ffmpeg concat demuxer script showing each image for its duration."""
+    def quote(path):
+        return "'" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+    lines = ["ffconcat version 1.0"]
+    for img_path, duration in image_durations:
+        lines.append(f"file {quote(img_path)}")
+        lines.append(f"duration {duration:.3f}")
+    # The concat demuxer ignores the duration of the last entry unless it is repeated
+    lines.append(f"file {quote(image_durations[-1][0])}")
+
+    with open(list_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return list_path
+
+def build_slideshow_command(list_path, audio_path, output_path, hls_dir=None, profile=None, duration=None):
+    """
+    Build the ffmpeg command for a still-image slideshow.
+
+    The stills are frames prepared at the output size (see core/frames.py), so
+    ffmpeg neither decodes nor scales them. Encoder settings come from the
+    render profile (core/profiles.py, default: RENDER_PROFILE). Each still is
+    encoded once; when the profile sets no fps the output keeps one frame per
+    image (variable frame rate).
+
+    With hls_dir, the same encode is also written as HLS segments and a
+    playlist in hls_dir (through the tee muxer), so playback can start while
+    later segments are still being encoded.
+
+    duration (the narration length) caps constant frame rate output, which
+    otherwise keeps showing the last still past the end of the speech.
+    """
+    profile = profile or get_render_profile()
+    fps = profile.fps
+    command = [
+        get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', audio_path,
+        '-map', '0:v:0', '-map', '1:a:0',
+        *profile.video_args(), '-pix_fmt', 'yuv420p',
+        # The frames are converted with BT.709 coefficients
+        '-colorspace', 'bt709', '-color_primaries', 'bt709', '-color_trc', 'bt709',
+    ]
+    if hls_dir:
+        fps = fps or HLS_FPS
+        command += ['-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})']
+    if fps:
+        command += ['-r', str(fps)]
+        if duration:
+            command += ['-t', f'{duration:.3f}']
+    else:
+        command += ['-vsync', 'vfr']
+
+    command += profile.audio_args(audio_path)
+
+    if hls_dir:
+        hls_options = ":".join(f"{key}={value}" for key, value in hls_muxer_options(hls_dir).items())
+        command += [
+            '-f', 'tee',
+            f"[f=mp4:movflags=+faststart]{output_path}|"
+            f"[f=hls:{hls_options}]{os.path.join(hls_dir, HLS_PLAYLIST_NAME)}"
+        ]
+        return command
+
+    # Move the moov atom to the front so players can start before the whole file arrives
+    command += ['-movflags', '+faststart']
+    command.append(output_path)
+    return command
+
+def segment_to_hls(video_path, hls_dir):
+    """Split a finished MP4 into HLS segments without re-encoding (for renderers that cannot write HLS)."""
+    os.makedirs(hls_dir, exist_ok=True)
+    command = [get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-i', video_path, '-c', 'copy', '-f', 'hls']
+    for key, value in hls_muxer_options(hls_dir).items():
+        command += [f'-{key}', value]
+    command.append(os.path.join(hls_dir, HLS_PLAYLIST_NAME))
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {result.returncode}: {result.stderr.strip()}")
+    return os.path.join(hls_dir, HLS_PLAYLIST_NAME)
+
+def render_slideshow(timeline, audio_path, output_path, progress=None, cancel_event=None,
+                     hls_dir=None, profile=None):
+    """
+    Encode a slideshow through ffmpeg's concat demuxer, bypassing moviepy's
+    per-frame compositing. The timeline shows yuv420p frames prepared at the
+    output size (core/frames.py).
+
+    progress and cancel_event have the same meaning as for the moviepy
+    renderer: a shared float updated with the encoded fraction and an event
+    that aborts the encode. hls_dir additionally writes HLS segments as the
+    encode proceeds; profile is the render profile (see build_slideshow_command).
+    """
+    from core.render import RenderCancelled
+
+    logger.info("Creating slideshow video with ffmpeg...")
+
+    total_duration = get_media_duration(audio_path)
+    image_durations = [(cue.image_path, cue.duration) for cue in timeline.fit(total_duration).cues]
+    list_path = os.path.splitext(output_path)[0] + "_slides.txt"
+    write_concat_list(image_durations, list_path)
+
+    if hls_dir:
+        os.makedirs(hls_dir, exist_ok=True)
+    command = build_slideshow_command(list_path, audio_path, output_path, hls_dir=hls_dir, profile=profile,
+                                      duration=total_duration)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    try:
+        # ffmpeg reports key=value progress lines roughly twice per second
+        for line in process.stdout:
+            if cancel_event is not None and cancel_event.is_set():
+                process.kill()
+                process.wait()
+                raise RenderCancelled("Render cancelled")
+
+            key, _, value = line.strip().partition('=')
+            if key == 'out_time_us' and progress is not None and total_duration:
+                try:
+                    progress.value = min(1.0, int(value) / 1_000_000 / total_duration)
+                except ValueError:
+                    pass
+
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed with exit code {process.returncode}: {stderr.strip()}")
+    except BaseException:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if hls_dir:
+            shutil.rmtree(hls_dir, ignore_errors=True)
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+    logger.info(f"Video saved to {output_path}")
+    return output_path
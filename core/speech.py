@@ -0,0 +1,126 @@
+import os
+import re
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# MPEG audio layer III tables, indexed by the header's version bits
+# (0: MPEG 2.5, 2: MPEG 2, 3: MPEG 1)
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+# Fallback sentence splitter when the NLTK punkt model is not available
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+_punkt_missing = set()
+
+def split_sentences(text, language="english"):
+    """Split text into sentences with NLTK's punkt model (language is its name, e.g. "italian")."""
+    from nltk.tokenize import sent_tokenize
+
+    try:
+        sentences = sent_tokenize(text, language=language.lower())
+    except LookupError:
+        # Streamed essays are split many times over: warn once per language
+        if language not in _punkt_missing:
+            _punkt_missing.add(language)
+            logger.warning(f"NLTK punkt data for {language} not available, splitting on punctuation")
+        sentences = _SENTENCE_END.split(text)
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+def _id3v2_size(data, offset=0):
+    if data[offset:offset + 3] != b'ID3' or len(data) < offset + 10:
+        return 0
+    size = 0
+    for byte in data[offset + 6:offset + 10]:
+        size = (size << 7) | (byte & 0x7f)
+    footer = 10 if data[offset + 5] & 0x10 else 0
+    return 10 + size + footer
+
+def iter_mp3_frames(data):
+    """
+    Yield (offset, length, duration) for every MPEG layer III audio frame in data.
+
+    ID3 tags, the Xing/Info header frame written by encoders and bytes that are
+    not a valid frame header are skipped.
+    """
+    offset = _id3v2_size(data)
+    first = True
+    while offset + 4 <= len(data):
+        header = int.from_bytes(data[offset:offset + 4], 'big')
+        version = (header >> 19) & 0x3
+        layer = (header >> 17) & 0x3
+        bitrate_index = (header >> 12) & 0xf
+        sample_rate_index = (header >> 10) & 0x3
+
+        if (header >> 21) != 0x7ff or version == 1 or layer != 1 \
+                or bitrate_index in (0, 15) or sample_rate_index == 3:
+            if data[offset:offset + 3] == b'TAG':
+                break
+            # Not a frame header: resynchronise on the next byte
+            offset += 1
+            continue
+
+        padding = (header >> 9) & 0x1
+        sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+        samples = 1152 if version == 3 else 576
+        length = samples // 8 * _MP3_BITRATES[version][bitrate_index] * 1000 // sample_rate + padding
+        if length <= 4:
+            offset += 1
+            continue
+
+        frame = data[offset:offset + length]
+        if first and (b'Xing' in frame or b'Info' in frame):
+            # Encoder header frame: its frame count would only describe the first part
+            first = False
+            offset += length
+            continue
+        first = False
+
+        yield offset, length, samples / sample_rate
+        offset += length
+
+def mp3_duration(path):
+    """Return the duration in seconds of an MP3 file by summing its frames."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return sum(duration for _, _, duration in iter_mp3_frames(data))
+
+def concat_mp3(part_paths, output_path):
+    """
+    Join MP3 files into output_path frame by frame, without re-encoding.
+
+    Tags and encoder header frames are dropped so players see one continuous
+    stream. Returns the duration in seconds of each part.
+    """
+    durations = []
+    part_output = output_path + '.part'
+    with open(part_output, 'wb') as out:
+        for path in part_paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            duration = 0.0
+            for offset, length, frame_duration in iter_mp3_frames(data):
+                out.write(data[offset:offset + length])
+                duration += frame_duration
+            durations.append(duration)
+    os.replace(part_output, output_path)
+    return durations
+
+def sentence_timings(sentences, durations):
+    """Turn per-sentence audio durations into [{"text", "start", "end"}] in seconds."""
+    timings = []
+    start = 0.0
+    for sentence, duration in zip(sentences, durations):
+        timings.append({"text": sentence, "start": round(start, 3), "end": round(start + duration, 3)})
+        start += duration
+    return timings
@@ -0,0 +1,105 @@
+import os
+import asyncio
+import logging
+from core.task_store import FINISHED_STATUSES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between task store reads for watched tasks (catches updates made by other processes)
+STATUS_POLL_INTERVAL = float(os.getenv('STATUS_POLL_INTERVAL', '1.0'))
+# Seconds without updates after which watchers get a keep-alive
+STATUS_HEARTBEAT_INTERVAL = float(os.getenv('STATUS_HEARTBEAT_INTERVAL', '15'))
+# Updates buffered per watcher; a slow watcher skips the oldest ones
+STATUS_QUEUE_SIZE = int(os.getenv('STATUS_QUEUE_SIZE', '16'))
+
+class StatusHub:
+    """
+    Fans task status changes out to any number of watchers.
+
+    Updates made in this process reach the hub immediately through a task store
+    listener. Updates made by workers in other processes are picked up by one
+    store read per watched task every poll_interval seconds, however many
+    clients watch it. Watchers only receive a task when it actually changed.
+    """
+
+    def __init__(self, tasks, poll_interval=STATUS_POLL_INTERVAL, heartbeat_interval=STATUS_HEARTBEAT_INTERVAL):
+        self.tasks = tasks
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._loop = None
+        self._watchers = {}
+        self._pollers = {}
+        self._last = {}
+
+    def start(self):
+        """Bind the hub to the running loop and start listening to the task store."""
+        self._loop = asyncio.get_running_loop()
+        self.tasks.add_listener(self.publish)
+
+    def stop(self):
+        self.tasks.remove_listener(self.publish)
+        for poller in self._pollers.values():
+            poller.cancel()
+        self._pollers.clear()
+
+    def publish(self, task_id, task):
+        """Task store listener; may be called from any thread."""
+        if self._loop is None or task_id not in self._watchers:
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, task_id, task)
+
+    def _dispatch(self, task_id, task):
+        if task is None or task == self._last.get(task_id):
+            return
+        self._last[task_id] = task
+        for queue in self._watchers.get(task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(task)
+
+    async def _poll(self, task_id):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self._dispatch(task_id, self.tasks.get(task_id))
+            except Exception as e:
+                logger.error(f"Error polling task {task_id}: {str(e)}")
+
+    async def watch(self, task_id):
+        """
+        Yield the task now and after every change, until it reaches a finished status.
+
+        None is yielded when nothing changed for heartbeat_interval seconds, so the
+        caller can keep the connection alive.
+        """
+        queue = asyncio.Queue(maxsize=STATUS_QUEUE_SIZE)
+        watchers = self._watchers.setdefault(task_id, set())
+        watchers.add(queue)
+        if task_id not in self._pollers:
+            self._pollers[task_id] = asyncio.create_task(self._poll(task_id))
+
+        try:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return
+            self._last[task_id] = task
+            yield task
+
+            while task.get("status") not in FINISHED_STATUSES:
+                try:
+                    task = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield task
+
+        finally:
+            watchers.discard(queue)
+            if not watchers:
+                del self._watchers[task_id]
+                self._last.pop(task_id, None)
+                poller = self._pollers.pop(task_id, None)
+                if poller is not None:
+                    poller.cancel()
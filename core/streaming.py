@@ -0,0 +1,193 @@
+import re
+import asyncio
+import logging
+from core.speech import split_sentences
+from core.timeline import split_portions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Characters that can end a sentence; until one shows up no sentence can have closed
+_SENTENCE_BREAK = re.compile(r'[.!?…\n]')
+
+# Portions cut while the essay streams are sized against the requested length, which
+# the model may fall short of: they are cut at this fraction of their share, and
+# fewer than half of the portions are cut that way
+_STREAMED_CUT_SHARE = 0.75
+
+class ItemStream:
+    """
+    Append-only sequence of items written by one pipeline stage and read by
+    others while it is still being written.
+
+    Every reader iterates over all the items from the start. Iteration ends
+    when the writer closes the stream, and raises the writer's error if it
+    failed. The writer may attach a result (e.g. the complete text) on close.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.result = None
+        self.closed = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def put(self, item):
+        if self.closed:
+            raise RuntimeError("Stream already closed")
+        self.items.append(item)
+        self._notify()
+
+    def close(self, result=None):
+        self.result = result
+        self.closed = True
+        self._notify()
+
+    def fail(self, error):
+        self.error = error
+        self.closed = True
+        self._notify()
+
+    async def started(self):
+        """Wait for the first item or the end of the stream; True if any item was written."""
+        while not self.items and not self.closed:
+            await self._changed.wait()
+        if not self.items and self.error:
+            raise self.error
+        return bool(self.items)
+
+    async def wait_closed(self):
+        """Wait for the end of the stream and return its result."""
+        while not self.closed:
+            await self._changed.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+    async def __aiter__(self):
+        index = 0
+        while True:
+            if index < len(self.items):
+                yield self.items[index]
+                index += 1
+            elif self.error:
+                raise self.error
+            elif self.closed:
+                return
+            else:
+                await self._changed.wait()
+
+async def iterate_items(items):
+    """Async iterator over a plain list, so lists and streams are consumed alike."""
+    for item in items:
+        yield item
+
+class SentenceSplitter:
+    """
+    Split text arriving in pieces (e.g. a streamed chat completion) into sentences.
+
+    A sentence is emitted once the next one has started, since only then can
+    the tokenizer tell a sentence end from an abbreviation; flush() returns the
+    last one. Only the unfinished tail of the text is kept and tokenized.
+    """
+
+    def __init__(self, language="english"):
+        self.language = language
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add a piece of text and return the sentences it closed."""
+        self._buffer += text
+        if not _SENTENCE_BREAK.search(self._buffer):
+            return []
+        sentences = split_sentences(self._buffer, self.language)
+        if len(sentences) < 2:
+            return []
+        # The last sentence may still be growing
+        self._buffer = self._buffer[self._buffer.rfind(sentences[-1]):]
+        return sentences[:-1]
+
+    def flush(self):
+        """Return the sentences left once the text is complete."""
+        sentences = split_sentences(self._buffer, self.language) if self._buffer.strip() else []
+        self._buffer = ""
+        return sentences
+
+class PortionCutter:
+    """
+    Group sentences into num_portions text portions while they are still arriving.
+
+    The incremental counterpart of split_portions (core/timeline.py): the
+    first portions are cut as soon as the text reaches _STREAMED_CUT_SHARE of
+    their share of expected_words, the length the essay was asked for, so work
+    on them can start before the essay is complete. Only fewer than half of the
+    portions are cut this way: finish() splits the rest of the text evenly with
+    split_portions, so an essay shorter than asked for does not leave the last
+    images with almost no narration. Positions follow the split_portions
+    convention (fraction of the sentences joined by single spaces) and are only
+    known once finish() has been called.
+    """
+
+    def __init__(self, num_portions, expected_words):
+        self.num_portions = num_portions
+        self.expected_words = max(expected_words, 1)
+        self.streamed_portions = (num_portions - 1) // 2
+        self.sentences = []
+        self.offsets = []
+        self.texts = []
+        self._length = 0
+        self._words = 0
+        self._next_start = 0
+        self._next_offset = 0
+        self._finished = False
+
+    def add(self, sentence):
+        """Add the next sentence; returns the (index, text) portions it completes."""
+        self.sentences.append(sentence)
+        self._length += len(sentence) + 1
+        self._words += len(sentence.split())
+
+        cut = len(self.offsets)
+        share = self.expected_words / self.num_portions * _STREAMED_CUT_SHARE
+        if cut >= self.streamed_portions or self._words < (cut + 1) * share:
+            return []
+        text = " ".join(self.sentences[self._next_start:])
+        self.offsets.append(self._next_offset)
+        self.texts.append(text)
+        self._next_start = len(self.sentences)
+        self._next_offset = self._length
+        return [(cut, text)]
+
+    def finish(self):
+        """Cut the remaining text into the portions still missing and return them as (index, text)."""
+        if not self.sentences:
+            raise ValueError("No text to split into portions")
+        self._finished = True
+
+        missing = self.num_portions - len(self.offsets)
+        remaining = self.sentences[self._next_start:]
+        portions = []
+        if remaining:
+            remaining_length = max(sum(len(sentence) + 1 for sentence in remaining) - 1, 1)
+            for text, position in split_portions(remaining, missing):
+                portions.append((len(self.offsets), text))
+                self.offsets.append(self._next_offset + position * remaining_length)
+                self.texts.append(text)
+        while len(self.offsets) < self.num_portions:
+            # The text ended right after a cut: repeat the last portion, as split_portions does
+            portions.append((len(self.offsets), self.texts[-1]))
+            self.offsets.append(self.offsets[-1])
+            self.texts.append(self.texts[-1])
+        return portions
+
+    def positions(self):
+        """Start of each portion as a fraction of the whole text."""
+        if not self._finished:
+            raise RuntimeError("Positions are only known once the text is complete")
+        total = max(self._length - 1, 1)
+        return [offset / total for offset in self.offsets]
@@ -0,0 +1,269 @@
+import os
+import copy
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Task store backend: "memory" or "sqlite:///path/to/tasks.db"
+TASK_STORE = os.getenv('TASK_STORE', 'memory')
+# Finished tasks older than this many seconds are evicted (0 disables eviction)
+TASK_TTL_SECONDS = int(os.getenv('TASK_TTL_SECONDS', '86400'))
+
+# Statuses after which a task no longer changes
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+class TaskStore:
+    """
+    Interface for task status storage.
+
+    Tasks are plain dicts with at least "status" and "created_at" (ISO format).
+    Every read returns a copy: changes must be written back with update().
+    Listeners added with add_listener() are called after every create and update
+    made through this instance.
+    """
+
+    def __init__(self, ttl_seconds=TASK_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call callback(task_id, task) whenever a task is created or updated."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, task_id, task):
+        for callback in self._listeners:
+            try:
+                callback(task_id, task)
+            except Exception as e:
+                logger.error(f"Task listener failed for {task_id}: {str(e)}")
+
+    def create(self, task_id, task):
+        raise NotImplementedError
+
+    def get(self, task_id):
+        """Return the task dict, or None if it does not exist."""
+        raise NotImplementedError
+
+    def update(self, task_id, fields):
+        """Merge fields into the task and return the updated task."""
+        raise NotImplementedError
+
+    def delete(self, task_id):
+        raise NotImplementedError
+
+    def list(self, status=None, created_after=None, created_before=None, limit=None):
+        """Return (task_id, task) pairs ordered by creation time, oldest first."""
+        raise NotImplementedError
+
+    def evict_expired(self):
+        """Delete finished tasks older than the TTL and return how many were removed."""
+        raise NotImplementedError
+
+    def __contains__(self, task_id):
+        return self.get(task_id) is not None
+
+    def __getitem__(self, task_id):
+        task = self.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    @staticmethod
+    def _finished_at(task, previous_finished_at=None):
+        if task.get("status") in FINISHED_STATUSES:
+            return previous_finished_at or time.time()
+        return None
+
+class InMemoryTaskStore(TaskStore):
+    """Task store kept in process memory; status is lost on restart."""
+
+    def __init__(self, ttl_seconds=TASK_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self._tasks = {}
+        self._finished_times = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id, task):
+        with self._lock:
+            self._tasks[task_id] = copy.deepcopy(task)
+            self._finished_times[task_id] = self._finished_at(task, None)
+        self._notify(task_id, copy.deepcopy(task))
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return copy.deepcopy(task) if task is not None else None
+
+    def update(self, task_id, fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                raise KeyError(task_id)
+            task.update(copy.deepcopy(fields))
+            self._finished_times[task_id] = self._finished_at(task, self._finished_times.get(task_id))
+            task = copy.deepcopy(task)
+        self._notify(task_id, task)
+        return task
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._finished_times.pop(task_id, None)
+
+    def list(self, status=None, created_after=None, created_before=None, limit=None):
+        with self._lock:
+            items = [
+                (task_id, copy.deepcopy(task)) for task_id, task in self._tasks.items()
+                if (status is None or task.get("status") == status)
+                and (created_after is None or task.get("created_at", "") >= created_after)
+                and (created_before is None or task.get("created_at", "") < created_before)
+            ]
+        items.sort(key=lambda item: item[1].get("created_at", ""))
+        return items[:limit] if limit else items
+
+    def evict_expired(self):
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                task_id for task_id, finished_at in self._finished_times.items()
+                if finished_at is not None and finished_at < cutoff
+            ]
+            for task_id in expired:
+                del self._tasks[task_id]
+                del self._finished_times[task_id]
+        return len(expired)
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Task store backed by a SQLite database in WAL mode, so several API workers
+    and job workers on the same machine share one view of every task.
+    """
+
+    def __init__(self, path, ttl_seconds=TASK_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _init_schema(self):
+        connection = self._connection()
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks (finished_at);
+        """)
+
+    def create(self, task_id, task):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO tasks (task_id, status, created_at, updated_at, finished_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (task_id, task.get("status", "queued"), task.get("created_at", ""), time.time(),
+             self._finished_at(task), json.dumps(task))
+        )
+        self._notify(task_id, copy.deepcopy(task))
+
+    def get(self, task_id):
+        row = self._connection().execute(
+            "SELECT data FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, task_id, fields):
+        connection = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent writers cannot lose updates
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT data, finished_at FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(task_id)
+            task = json.loads(row[0])
+            task.update(fields)
+            connection.execute(
+                "UPDATE tasks SET status = ?, updated_at = ?, finished_at = ?, data = ? WHERE task_id = ?",
+                (task.get("status", "queued"), time.time(), self._finished_at(task, row[1]),
+                 json.dumps(task), task_id)
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._notify(task_id, task)
+        return task
+
+    def delete(self, task_id):
+        self._connection().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def list(self, status=None, created_after=None, created_before=None, limit=None):
+        query = "SELECT task_id, data FROM tasks"
+        conditions = []
+        params = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if created_after is not None:
+            conditions.append("created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            conditions.append("created_at < ?")
+            params.append(created_before)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = self._connection().execute(query, params).fetchall()
+        return [(task_id, json.loads(data)) for task_id, data in rows]
+
+    def evict_expired(self):
+        if not self.ttl_seconds:
+            return 0
+        cursor = self._connection().execute(
+            "DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        return cursor.rowcount
+
+def create_task_store(url=None):
+    """Create the task store described by url (defaults to the TASK_STORE setting)."""
+    url = url or TASK_STORE
+    if url == "memory":
+        return InMemoryTaskStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteTaskStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported task store: {url}")
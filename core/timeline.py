@@ -0,0 +1,154 @@
+import bisect
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Cue:
+    """One image shown from start to end (seconds)."""
+
+    __slots__ = ("image_path", "start", "end")
+
+    def __init__(self, image_path, start, end):
+        self.image_path = image_path
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"Cue({self.image_path!r}, {self.start:.3f}, {self.end:.3f})"
+
+class Timeline:
+    """
+    Ordered, contiguous image cues covering the narration, consumed as-is by
+    the renderers. The first cue starts at 0 and each cue ends where the next
+    one starts.
+    """
+
+    def __init__(self, cues):
+        self.cues = sorted(cues, key=lambda cue: cue.start)
+
+    @property
+    def duration(self):
+        return self.cues[-1].end if self.cues else 0.0
+
+    def fit(self, duration):
+        """Return a copy whose last cue ends at duration (the measured audio length)."""
+        cues = [Cue(cue.image_path, cue.start, cue.end) for cue in self.cues]
+        while len(cues) > 1 and cues[-1].start >= duration:
+            cues.pop()
+            cues[-1].end = duration
+        if cues:
+            cues[-1].end = duration
+        return Timeline(cues)
+
+    def with_images(self, images):
+        """Return a copy showing images[path] instead of each cue's image (e.g. its prepared frame)."""
+        return Timeline([Cue(images.get(cue.image_path, cue.image_path), cue.start, cue.end) for cue in self.cues])
+
+    def to_list(self):
+        return [{"image": cue.image_path, "start": round(cue.start, 3), "end": round(cue.end, 3)} for cue in self.cues]
+
+def split_portions(sentences, num_portions):
+    """
+    Group consecutive sentences into num_portions text portions of similar length.
+
+    Returns (text, position) pairs, position being the fraction of the text
+    (sentences joined by single spaces) where the portion starts. Portions are
+    cut on sentence boundaries, or on word boundaries when there are fewer
+    sentences than portions; if there are fewer words still, the last portion
+    is repeated.
+    """
+    units = sentences
+    if len(units) < num_portions:
+        units = " ".join(sentences).split()
+    if not units:
+        raise ValueError("No text to split into portions")
+
+    # Character offset of each unit in the joined text
+    offsets = []
+    total = 0
+    for unit in units:
+        offsets.append(total)
+        total += len(unit) + 1
+    total = max(total - 1, 1)
+
+    count = min(num_portions, len(units))
+    starts = [0]
+    for k in range(1, count):
+        target = k * total / count
+        # Closest unit boundary to the target, leaving at least one unit per remaining portion
+        low = starts[-1] + 1
+        high = len(units) - (count - k)
+        index = min(range(low, high + 1), key=lambda i: abs(offsets[i] - target))
+        starts.append(index)
+
+    portions = []
+    for k, start in enumerate(starts):
+        end = starts[k + 1] if k + 1 < len(starts) else len(units)
+        portions.append((" ".join(units[start:end]), offsets[start] / total))
+
+    while len(portions) < num_portions:
+        portions.append(portions[-1])
+    return portions
+
+def text_position_to_time(position, timings):
+    """
+    Map a position in the narrated text (fraction of its characters) to seconds,
+    interpolating inside the sentence that contains it.
+
+    timings are the speech timings: [{"text", "start", "end"}] per sentence.
+    """
+    lengths = [len(timing["text"]) + 1 for timing in timings]
+    total = max(sum(lengths) - 1, 1)
+    offset = position * total
+
+    starts = []
+    cumulative = 0
+    for length in lengths:
+        starts.append(cumulative)
+        cumulative += length
+
+    index = max(bisect.bisect_right(starts, offset) - 1, 0)
+    timing = timings[index]
+    fraction = min(max((offset - starts[index]) / lengths[index], 0.0), 1.0)
+    return timing["start"] + fraction * (timing["end"] - timing["start"])
+
+def build_timeline(images_with_positions, timings=None, duration=None):
+    """
+    Turn (image, position) pairs into a Timeline.
+
+    With speech timings, each image starts when the narration reaches the start
+    of its text portion. Without them, positions are spread linearly over
+    duration. Missing images (e.g. failed generations) are covered by the
+    previous one; images that would get no time at all are dropped.
+    """
+    if not images_with_positions:
+        raise ValueError("No images to place on the timeline")
+    if timings:
+        duration = timings[-1]["end"] if duration is None else duration
+        to_time = lambda position: text_position_to_time(position, timings)
+    elif duration is not None:
+        to_time = lambda position: position * duration
+    else:
+        raise ValueError("Either speech timings or a duration is required")
+
+    ordered = sorted(images_with_positions, key=lambda item: item[1])
+    starts = [0.0] + [to_time(position) for _, position in ordered[1:]]
+
+    cues = []
+    for i, (image_path, _) in enumerate(ordered):
+        end = starts[i + 1] if i + 1 < len(ordered) else duration
+        if end - starts[i] > 0 or (i == len(ordered) - 1 and not cues):
+            cues.append(Cue(image_path, starts[i], end))
+        elif cues:
+            logger.info(f"Image {image_path} gets no narration time and is skipped")
+    # A dropped image's time goes to the one before it
+    for current, following in zip(cues, cues[1:]):
+        current.end = following.start
+    cues[-1].end = duration
+    return Timeline(cues)
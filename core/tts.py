@@ -0,0 +1,216 @@
+import os
+import wave
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+import contextlib
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Speech engine: "gtts" (Google, online), "espeak" (espeak-ng, offline) or "piper" (neural, offline)
+TTS_BACKENDS = ("gtts", "espeak", "piper")
+TTS_BACKEND = os.getenv('TTS_BACKEND', 'gtts')
+
+# espeak-ng binary and speaking rate in words per minute
+ESPEAK_BINARY = os.getenv('ESPEAK_BINARY', 'espeak-ng')
+ESPEAK_SPEED = int(os.getenv('ESPEAK_SPEED', '160'))
+
+# Piper voice models per language, e.g. "en=/models/en_US-lessac-medium.onnx,it=/models/it_IT-riccardo-x_low.onnx",
+# and how many loaded copies of each model are kept for concurrent synthesis
+PIPER_VOICES = os.getenv('PIPER_VOICES', '')
+PIPER_POOL_SIZE = int(os.getenv('PIPER_POOL_SIZE', '2'))
+
+# Local engines produce WAV; it is encoded to MP3 so every backend yields the same format
+TTS_MP3_BITRATE = os.getenv('TTS_MP3_BITRATE', '64k')
+
+def encode_mp3(wav_input, path):
+    """Encode WAV (a file path, or bytes) to an MP3 at path with ffmpeg."""
+    from core.slideshow import get_ffmpeg_binary
+
+    source = wav_input if isinstance(wav_input, str) else 'pipe:0'
+    command = [get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-i', source,
+               '-ac', '1', '-c:a', 'libmp3lame', '-b:a', TTS_MP3_BITRATE, path]
+    result = subprocess.run(command, input=None if isinstance(wav_input, str) else wav_input,
+                            capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {result.returncode}: {result.stderr.decode().strip()}")
+    return path
+
+class TTSBackend:
+    """
+    Interface for speech synthesis engines.
+
+    synthesize() is blocking and is called from the speech thread pool, possibly
+    from several threads at once. It writes an MP3 file.
+    """
+
+    name = None
+
+    def synthesize(self, text, language_code, path):
+        raise NotImplementedError
+
+    def voice_id(self, language_code):
+        """Identify the voice used for a language, so cached speech is keyed on it."""
+        return self.name
+
+    def warm_up(self, language_codes=()):
+        """Load whatever the engine needs ahead of the first synthesis."""
+
+    def close(self):
+        pass
+
+class GTTSBackend(TTSBackend):
+    """Google Translate's text-to-speech service through gTTS (needs network access)."""
+
+    name = "gtts"
+
+    def synthesize(self, text, language_code, path):
+        from gtts import gTTS
+        gTTS(text=text, lang=language_code).save(path)
+        return path
+
+class EspeakBackend(TTSBackend):
+    """espeak-ng, a small formant synthesizer that runs offline with negligible startup cost."""
+
+    name = "espeak"
+
+    def __init__(self, binary=ESPEAK_BINARY, speed=ESPEAK_SPEED):
+        if shutil.which(binary) is None:
+            raise RuntimeError(f"{binary} not found; install espeak-ng or set ESPEAK_BINARY")
+        self.binary = binary
+        self.speed = speed
+
+    def synthesize(self, text, language_code, path):
+        # The text goes through stdin: as an argument, a sentence starting with '-' would be read as an option
+        result = subprocess.run(
+            [self.binary, '-v', language_code, '-s', str(self.speed), '--stdout', '--stdin'],
+            input=text.encode(), capture_output=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"espeak-ng failed with exit code {result.returncode}: {result.stderr.decode().strip()}")
+        return encode_mp3(result.stdout, path)
+
+    def voice_id(self, language_code):
+        # The binary (espeak or espeak-ng) and the speed both change the speech
+        return f"espeak:{os.path.basename(self.binary)}:{self.speed}"
+
+class VoicePool:
+    """
+    Fixed number of loaded copies of one voice model, lent to one thread at a time.
+
+    Models are loaded on first use (or by warm_up) and stay loaded for the life
+    of the process, so tasks do not pay the loading cost.
+    """
+
+    def __init__(self, loader, size=PIPER_POOL_SIZE):
+        self.loader = loader
+        self.size = size
+        self._voices = queue.Queue()
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        while self._load_one():
+            pass
+
+    def _load_one(self):
+        with self._lock:
+            if self._loaded >= self.size:
+                return False
+            self._voices.put(self.loader())
+            self._loaded += 1
+            return True
+
+    @contextlib.contextmanager
+    def acquire(self):
+        try:
+            voice = self._voices.get_nowait()
+        except queue.Empty:
+            # Load another copy while below the pool size, otherwise wait for one
+            self._load_one()
+            voice = self._voices.get()
+        try:
+            yield voice
+        finally:
+            self._voices.put(voice)
+
+class PiperBackend(TTSBackend):
+    """Piper neural voices (ONNX, CPU), with a warm pool of loaded models per language."""
+
+    name = "piper"
+
+    def __init__(self, voices=PIPER_VOICES, pool_size=PIPER_POOL_SIZE):
+        # Imported here: piper-tts is optional and only needed by this backend
+        from piper import PiperVoice
+
+        self.models = {}
+        for entry in filter(None, (item.strip() for item in voices.split(','))):
+            language_code, _, model_path = entry.partition('=')
+            self.models[language_code.strip()] = model_path.strip()
+        if not self.models:
+            raise RuntimeError("No Piper voices configured; set PIPER_VOICES")
+
+        self._pools = {
+            language_code: VoicePool(lambda path=model_path: PiperVoice.load(path), pool_size)
+            for language_code, model_path in self.models.items()
+        }
+
+    def _pool(self, language_code):
+        pool = self._pools.get(language_code)
+        if pool is None:
+            raise ValueError(f"No Piper voice configured for language: {language_code}")
+        return pool
+
+    def voice_id(self, language_code):
+        return f"piper:{os.path.basename(self.models.get(language_code, ''))}"
+
+    def warm_up(self, language_codes=()):
+        for language_code in language_codes or self._pools:
+            if language_code in self._pools:
+                self._pools[language_code].warm_up()
+                logger.info(f"Piper voice for {language_code} loaded")
+
+    def synthesize(self, text, language_code, path):
+        wav_path = os.path.splitext(path)[0] + '.wav'
+        try:
+            with self._pool(language_code).acquire() as voice, wave.open(wav_path, 'wb') as wav_file:
+                if hasattr(voice, 'synthesize_wav'):
+                    voice.synthesize_wav(text, wav_file)
+                else:
+                    voice.synthesize(text, wav_file)
+            return encode_mp3(wav_path, path)
+        finally:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+_BACKEND_CLASSES = {
+    "gtts": GTTSBackend,
+    "espeak": EspeakBackend,
+    "piper": PiperBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_tts_backend(name=None):
+    """Return the process-wide instance of a TTS backend (default: TTS_BACKEND)."""
+    name = name or TTS_BACKEND
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f"Unsupported TTS backend: {name}")
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = _BACKEND_CLASSES[name]()
+            _backends[name] = backend
+        return backend
+
+def warm_up_tts_backend(name=None):
+    """Create the configured backend and load its voices; errors are logged, not raised."""
+    try:
+        get_tts_backend(name).warm_up()
+    except Exception as e:
+        logger.error(f"Could not warm up TTS backend {name or TTS_BACKEND}: {str(e)}")
@@ -1,13 +1,59 @@
 import logging
+import asyncio
+import weakref
+import hashlib
+import functools
+from datetime import datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 from duckduckgo_search import DDGS
 from swarm import Swarm, Agent
 import os
 from openai import OpenAI
+from core.cache import TTLCache, normalize_text
+from core.clients import get_openai_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Durata (secondi) delle cache dei risultati di ricerca e dei contenuti finali
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '900'))
+CONTENT_CACHE_TTL = int(os.getenv('CONTENT_CACHE_TTL', '1800'))
+
+# Il flusso Swarm è sincrono: gira in un pool di thread dedicato e limitato
+WEB_SEARCH_WORKERS = int(os.getenv('WEB_SEARCH_WORKERS', '4'))
+# Timeout (secondi): intero flusso di agenti, singola chiamata al modello, singola ricerca DuckDuckGo
+WEB_SEARCH_TIMEOUT = float(os.getenv('WEB_SEARCH_TIMEOUT', '120'))
+WEB_SEARCH_LLM_TIMEOUT = float(os.getenv('WEB_SEARCH_LLM_TIMEOUT', '60'))
+WEB_SEARCH_DDG_TIMEOUT = int(os.getenv('WEB_SEARCH_DDG_TIMEOUT', '10'))
+# Numero massimo di turni del flusso ricerca -> filtro -> contenuto
+WEB_SEARCH_MAX_TURNS = int(os.getenv('WEB_SEARCH_MAX_TURNS', '10'))
+
+# Modalità di ricerca: "agents" (flusso Swarm ricerca -> filtro -> contenuto) oppure
+# "direct" (query predefinite eseguite in parallelo e un'unica chiamata di sintesi)
+SEARCH_MODES = ("agents", "direct")
+WEB_SEARCH_MODE = os.getenv('WEB_SEARCH_MODE', 'agents')
+# Risultati richiesti a DuckDuckGo per ciascuna query in modalità "direct"
+DIRECT_SEARCH_MAX_RESULTS = int(os.getenv('DIRECT_SEARCH_MAX_RESULTS', '5'))
+
+_search_executor = ThreadPoolExecutor(max_workers=WEB_SEARCH_WORKERS, thread_name_prefix="web-search")
+
+# Cache condivise da tutte le istanze dell'agente nel processo
+search_results_cache = TTLCache(SEARCH_CACHE_TTL)
+content_cache = TTLCache(CONTENT_CACHE_TTL)
+
+# Generazioni in corso per (argomento, lingua), una mappa per event loop
+_in_flight = weakref.WeakKeyDictionary()
+
+def _get_in_flight():
+    loop = asyncio.get_running_loop()
+    in_flight = _in_flight.get(loop)
+    if in_flight is None:
+        in_flight = {}
+        _in_flight[loop] = in_flight
+    return in_flight
+
 class WebSearchAgent:
     """
     Agente per la ricerca web che utilizza OpenAI Swarm e DuckDuckGo Search
@@ -24,16 +70,20 @@ class WebSearchAgent:
         """
         self.openai_key = openai_key if openai_key else os.getenv('OPENAI_API_KEY')
         # Creiamo prima il client OpenAI
-        openai_client = OpenAI(api_key=self.openai_key)
+        self.openai_client = OpenAI(api_key=self.openai_key, timeout=WEB_SEARCH_LLM_TIMEOUT)
         # Poi passiamo il client a Swarm
-        self.swarm_client = Swarm(client=openai_client)
-        self.ddgs = DDGS()
+        self.swarm_client = Swarm(client=self.openai_client)
+        self.ddgs = DDGS(timeout=WEB_SEARCH_DDG_TIMEOUT)
         
         # Inizializza gli agenti
         self.search_agent = self._create_search_agent()
         self.filter_agent = self._create_filter_agent()
         self.content_agent = self._create_content_agent()
     
+    def close(self):
+        """Chiude le connessioni del client OpenAI sincrono usato da Swarm."""
+        self.openai_client.close()
+
     def _search_web(self, query, max_results=5):
         """
         Funzione per cercare informazioni sul web utilizzando DuckDuckGo.
@@ -45,26 +95,50 @@ class WebSearchAgent:
         Returns:
             str: Risultati della ricerca formattati
         """
-        logger.info(f"Searching the web for: {query}")
-        
         try:
-            results = list(self.ddgs.text(query, max_results=max_results))
+            results = self._fetch_results(query, max_results)
             
             if not results:
                 return "No search results found."
             
-            formatted_results = ""
-            for i, result in enumerate(results, 1):
-                formatted_results += f"[{i}] {result['title']}\n"
-                formatted_results += f"URL: {result['href']}\n"
-                formatted_results += f"Content: {result['body']}\n\n"
-            
-            return formatted_results
+            return self._format_results(results)
         
         except Exception as e:
             logger.error(f"Error during web search: {str(e)}")
             return f"Error during web search: {str(e)}"
     
+    @staticmethod
+    def _format_results(results):
+        formatted_results = ""
+        for i, result in enumerate(results, 1):
+            formatted_results += f"[{i}] {result['title']}\n"
+            formatted_results += f"URL: {result['href']}\n"
+            formatted_results += f"Content: {result['body']}\n\n"
+        return formatted_results
+    
+    def _fetch_results(self, query, max_results=5):
+        """
+        Restituisce i risultati grezzi di DuckDuckGo, usando la cache per le
+        query già eseguite di recente.
+        
+        Args:
+            query (str): La query di ricerca
+            max_results (int): Numero massimo di risultati da restituire
+            
+        Returns:
+            list: Risultati con le chiavi 'title', 'href' e 'body'
+        """
+        key = (normalize_text(query, lowercase=True), max_results)
+        results = search_results_cache.get(key)
+        if results is not None:
+            logger.info(f"Search results for '{query}' loaded from cache")
+            return results
+        
+        logger.info(f"Searching the web for: {query}")
+        results = list(self.ddgs.text(query, max_results=max_results))
+        search_results_cache.set(key, results)
+        return results
+    
     def _create_search_agent(self):
         """
         Crea l'agente di ricerca che esegue query sul web.
@@ -125,17 +199,54 @@ class WebSearchAgent:
             model="gpt-4"
         )
     
-    async def generate_content(self, topic, language="en"):
+    async def generate_content(self, topic, language="en", mode=None):
         """
         Genera contenuto su un argomento utilizzando la ricerca web.
         
+        Il contenuto viene riutilizzato per CONTENT_CACHE_TTL secondi, e le
+        richieste concorrenti per lo stesso argomento condividono una sola ricerca.
+        
         Args:
             topic (str): L'argomento su cui generare contenuto
             language (str): La lingua in cui generare il contenuto
+            mode (str, optional): "agents" o "direct"; se non indicata si usa WEB_SEARCH_MODE
             
         Returns:
             str: Il contenuto generato
         """
+        mode = mode or WEB_SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode: {mode}")
+        
+        key = (normalize_text(topic, lowercase=True), language, mode)
+        content = content_cache.get(key)
+        if content is not None:
+            logger.info(f"Content for topic '{topic}' loaded from cache")
+            return content
+        
+        in_flight = _get_in_flight()
+        task = in_flight.get(key)
+        if task is None:
+            generate = self._generate_content_direct if mode == "direct" else self._generate_content
+            task = asyncio.ensure_future(generate(topic, language))
+            in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget_in_flight(in_flight, key, done))
+        else:
+            logger.info(f"Joining the search already in progress for topic: {topic}")
+        
+        # shield: se un chiamante viene annullato, la ricerca continua per gli altri
+        content = await asyncio.shield(task)
+        content_cache.set(key, content)
+        return content
+    
+    @staticmethod
+    def _forget_in_flight(in_flight, key, task):
+        in_flight.pop(key, None)
+        # Segna l'eccezione come letta anche se tutti i chiamanti sono stati annullati
+        if not task.cancelled():
+            task.exception()
+    
+    async def _generate_content(self, topic, language):
         logger.info(f"Generating content for topic: {topic} in language: {language}")
         
         # Prepara il messaggio iniziale per l'agente di ricerca
@@ -149,11 +260,20 @@ class WebSearchAgent:
         }
         
         try:
-            # Esegui il flusso di agenti
-            response = self.swarm_client.run(
+            # Esegui il flusso di agenti in un thread, senza bloccare l'event loop.
+            # Allo scadere del timeout il thread termina da solo grazie ai timeout
+            # del client OpenAI e di DuckDuckGo.
+            run = functools.partial(
+                self.swarm_client.run,
                 agent=self.search_agent,
                 messages=[initial_message],
-                context_variables={"topic": topic, "language": language}
+                context_variables={"topic": topic, "language": language},
+                max_turns=WEB_SEARCH_MAX_TURNS
+            )
+            loop = asyncio.get_running_loop()
+            response = await asyncio.wait_for(
+                loop.run_in_executor(_search_executor, run),
+                timeout=WEB_SEARCH_TIMEOUT
             )
             
             # Estrai il contenuto finale
@@ -162,6 +282,125 @@ class WebSearchAgent:
             
             return final_content
         
+        except asyncio.TimeoutError:
+            logger.error(f"Web search timed out after {WEB_SEARCH_TIMEOUT:g}s")
+            raise
+        
+        except Exception as e:
+            logger.error(f"Error generating content: {str(e)}")
+            raise
+    
+    @staticmethod
+    def expand_queries(topic):
+        """
+        Espande l'argomento in un insieme fisso di query, senza chiamate al modello.
+        
+        Args:
+            topic (str): L'argomento della ricerca
+            
+        Returns:
+            list: Le query da eseguire
+        """
+        topic = normalize_text(topic)
+        year = datetime.now().year
+        return [
+            topic,
+            f"{topic} latest news",
+            f"{topic} {year}",
+            f"{topic} analysis facts",
+        ]
+    
+    @staticmethod
+    def dedupe_results(results):
+        """
+        Rimuove i risultati duplicati per URL e per contenuto.
+        
+        Gli URL vengono confrontati senza schema, "www.", frammento e "/" finale;
+        i contenuti tramite un hash del testo normalizzato.
+        
+        Args:
+            results (list): Risultati con le chiavi 'title', 'href' e 'body'
+            
+        Returns:
+            list: I risultati unici, nell'ordine originale
+        """
+        seen_urls = set()
+        seen_bodies = set()
+        unique = []
+        for result in results:
+            parts = urlsplit(result.get('href', ''))
+            host = parts.netloc.lower()
+            if host.startswith("www."):
+                host = host[4:]
+            url_key = f"{host}{parts.path.rstrip('/')}?{parts.query}"
+            body_key = hashlib.sha1(
+                normalize_text(result.get('body', ''), lowercase=True).encode('utf-8')
+            ).hexdigest()
+            
+            if url_key in seen_urls or body_key in seen_bodies:
+                continue
+            seen_urls.add(url_key)
+            seen_bodies.add(body_key)
+            unique.append(result)
+        return unique
+    
+    async def _search_many(self, queries, max_results):
+        """Esegue le ricerche in parallelo nel pool dedicato, ignorando quelle fallite."""
+        loop = asyncio.get_running_loop()
+        searches = [
+            loop.run_in_executor(_search_executor, self._fetch_results, query, max_results)
+            for query in queries
+        ]
+        results = []
+        for query, outcome in zip(queries, await asyncio.gather(*searches, return_exceptions=True)):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Search for '{query}' failed: {str(outcome)}")
+                continue
+            results.extend(outcome)
+        return results
+    
+    async def _generate_content_direct(self, topic, language):
+        """
+        Modalità "direct": query predefinite eseguite in parallelo, risultati
+        deduplicati e un'unica chiamata di sintesi al posto del flusso di agenti.
+        """
+        logger.info(f"Generating content (direct search) for topic: {topic} in language: {language}")
+        
+        try:
+            queries = self.expand_queries(topic)
+            results = await asyncio.wait_for(
+                self._search_many(queries, DIRECT_SEARCH_MAX_RESULTS),
+                timeout=WEB_SEARCH_TIMEOUT
+            )
+            results = self.dedupe_results(results)
+            if not results:
+                raise RuntimeError("No search results found")
+            logger.info(f"{len(results)} unique results from {len(queries)} queries")
+            
+            # Client asincrono condiviso del processo, con il timeout della ricerca web
+            client = get_openai_client(self.openai_key).with_options(timeout=WEB_SEARCH_LLM_TIMEOUT)
+            response = await client.chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": """
+                    You are a research assistant. You receive web search results about a topic.
+                    Extract the most relevant and accurate information, ignoring irrelevant or duplicate content,
+                    and write a well-structured, informative and engaging essay based on it.
+                    The essay should be factual, up-to-date, and provide valuable insights on the topic.
+                    """},
+                    {"role": "user", "content": f"Topic: {topic}\n\nSearch results:\n\n{self._format_results(results)}"}
+                ]
+            )
+            
+            final_content = response.choices[0].message.content
+            logger.info("Content generation completed successfully")
+            
+            return final_content
+        
+        except asyncio.TimeoutError:
+            logger.error(f"Web search timed out after {WEB_SEARCH_TIMEOUT:g}s")
+            raise
+        
         except Exception as e:
             logger.error(f"Error generating content: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
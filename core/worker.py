@@ -0,0 +1,174 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import asyncio
+from core.generator import VideoGenerator
+from core.job_queue import JOB_LEASE_SECONDS
+from core.render import render_pool
+from core.tts import warm_up_tts_backend
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Jobs a single worker runs at the same time
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+# Seconds between queue polls when the worker is idle or full
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '1.0'))
+# Seconds a shutting down worker waits for its running jobs before requeuing them
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv('WORKER_SHUTDOWN_TIMEOUT', '60'))
+
+async def run_video_job(task_id, request, tasks):
+    """Generate the video described by a queued request (a VideoRequest as a dict)."""
+    generator = None
+    try:
+        # Create output directory for this task
+        output_dir = os.path.join("output", task_id)
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Initialize video generator with task tracking and optional API key
+        generator = VideoGenerator(
+            task_id=task_id,
+            tasks=tasks,
+            openai_key=request.get("openai_key")
+        )
+
+        # Generate video with the given parameters
+        return await generator.generate(
+            topic=request["topic"],
+            num_images=request["num_images"],
+            language=request["language"],
+            text_model=request["text_model"],
+            image_model=request["image_model"],
+            video_length=request["video_length"],
+            output_dir=output_dir,
+            use_web_search=request.get("use_web_search", True),
+            prompt_mode=request.get("prompt_mode"),
+            search_mode=request.get("search_mode"),
+            output_format=request.get("output_format"),
+            tts_backend=request.get("tts_backend"),
+            render_profile=request.get("render_profile")
+        )
+
+    except Exception as e:
+        logger.error(f"Error in run_video_job: {str(e)}")
+        tasks.update(task_id, {"status": "failed", "error": str(e)})
+        raise
+    finally:
+        if generator is not None:
+            await generator.close()
+
+class Worker:
+    """
+    Pulls jobs from the job queue and runs up to `concurrency` of them at once.
+
+    A worker can run inside the API process or on its own (see worker.py); in
+    the latter case the task store must be shared, i.e. TASK_STORE=sqlite:///...
+
+    While its jobs run the worker renews their leases, and it requeues the jobs
+    of workers that stopped renewing theirs (JOB_LEASE_SECONDS).
+    """
+
+    def __init__(self, queue, tasks, concurrency=WORKER_CONCURRENCY, worker_id=None):
+        self.queue = queue
+        self.tasks = tasks
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._active = {}
+        self._stopping = False
+        self._last_heartbeat = 0
+
+    async def run(self):
+        """Claim and run jobs until stop() is called, then wait for the running ones."""
+        logger.info(f"Worker {self.worker_id} started (concurrency {self.concurrency})")
+
+        # Jobs left running by a previous process with the same worker id, or by
+        # any worker whose lease expired, are picked up again. Queue calls run in
+        # threads: a busy SQLite file must not stall the loop (and the API with it)
+        await asyncio.to_thread(self._reclaim_own)
+        await asyncio.to_thread(self._reclaim_stale)
+
+        # Local TTS engines load their voices once, before the first job needs them
+        await asyncio.to_thread(warm_up_tts_backend)
+
+        while not self._stopping:
+            self._check_cancellations()
+            await self._renew_leases()
+
+            job = None
+            if len(self._active) < self.concurrency:
+                job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+
+            if job is None:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+
+            task_id, request = job
+            self._active[task_id] = asyncio.create_task(self._run_job(task_id, request))
+
+        if self._active:
+            logger.info(f"Worker {self.worker_id} waiting for {len(self._active)} running jobs")
+            await asyncio.gather(*self._active.values(), return_exceptions=True)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def stop(self):
+        """Stop claiming new jobs; run() returns once the running jobs finish."""
+        self._stopping = True
+
+    def abort(self):
+        """Interrupt the running jobs and put them back in the queue; run() returns once they have stopped."""
+        self._stopping = True
+        for job in list(self._active.values()):
+            job.cancel()
+
+    async def _run_job(self, task_id, request):
+        status = "failed"
+        try:
+            logger.info(f"Worker {self.worker_id} running job {task_id}")
+            await run_video_job(task_id, request, self.tasks)
+            task = self.tasks.get(task_id) or {}
+            status = "cancelled" if task.get("status") == "cancelled" else "done"
+        except asyncio.CancelledError:
+            # Interrupted by a shutdown, not by the user: the job runs again later
+            status = None
+            if await asyncio.to_thread(self.queue.requeue, task_id):
+                await asyncio.to_thread(self._requeue_interrupted, [task_id])
+            raise
+        except Exception as e:
+            logger.error(f"Job {task_id} failed: {str(e)}")
+        finally:
+            if status:
+                await asyncio.to_thread(self.queue.finish, task_id, status)
+            self._active.pop(task_id, None)
+
+    async def _renew_leases(self):
+        # A few heartbeats per lease keep a slow poll from letting it expire
+        now = time.monotonic()
+        if now - self._last_heartbeat < JOB_LEASE_SECONDS / 4:
+            return
+        self._last_heartbeat = now
+        await asyncio.to_thread(self.queue.heartbeat, self.worker_id, list(self._active))
+        await asyncio.to_thread(self._reclaim_stale)
+
+    def _reclaim_own(self):
+        self._requeue_interrupted(self.queue.release(self.worker_id))
+
+    def _reclaim_stale(self):
+        self._requeue_interrupted(self.queue.requeue_stale())
+
+    def _requeue_interrupted(self, job_ids):
+        for task_id in job_ids:
+            # An in-memory task store loses its tasks with the process that held them
+            if self.tasks.get(task_id) is not None:
+                self.tasks.update(task_id, {"status": "queued", "current_step": "Requeued after an interrupted run"})
+        if job_ids:
+            logger.info(f"Worker {self.worker_id} requeued {len(job_ids)} interrupted jobs")
+
+    def _check_cancellations(self):
+        # Cancellation is requested through the task store, possibly by another process
+        for task_id in list(self._active):
+            task = self.tasks.get(task_id)
+            if task and task.get("cancel_requested"):
+                render_pool.cancel(task_id)
@@ -47,32 +47,32 @@ function App() {
     setMode((prevMode) => (prevMode === 'light' ? 'dark' : 'light'));
   };
 
-  useEffect(() => {
-    let intervalId;
+  const isFinished = status === 'completed' || status === 'failed' || status === 'cancelled';
 
-    if (taskId && status !== 'completed' && status !== 'failed') {
-      intervalId = setInterval(async () => {
-        try {
-          const response = await api.checkStatus(taskId);
-          setStatus(response.status);
-          setCurrentStep(response.current_step || '');
-          setProgress(response.progress || 0);
-          if (response.error) {
-            setError(response.error);
-          }
-        } catch (err) {
-          console.error('Error checking status:', err);
-          toast.error('Error checking video status');
-        }
-      }, 2000); // Poll every 2 seconds
+  useEffect(() => {
+    if (!taskId || isFinished) {
+      return undefined;
     }
 
-    return () => {
-      if (intervalId) {
-        clearInterval(intervalId);
+    // Status changes are pushed by the server as they happen
+    const stopWatching = api.watchStatus(
+      taskId,
+      (response) => {
+        setStatus(response.status);
+        setCurrentStep(response.current_step || '');
+        setProgress(response.progress || 0);
+        if (response.error) {
+          setError(response.error);
+        }
+      },
+      (err) => {
+        console.error('Error watching status:', err);
+        toast.error('Error checking video status');
       }
-    };
-  }, [taskId, status]);
+    );
+
+    return stopWatching;
+  }, [taskId, isFinished]);
 
   const handleSubmit = async (formData) => {
     setIsLoading(true);
@@ -93,22 +93,13 @@ function App() {
     }
   };
 
-  const handleDownload = async () => {
-    try {
-      const blob = await api.downloadVideo(taskId);
-      const url = window.URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url;
-      a.download = `video_${taskId}.mp4`;
-      document.body.appendChild(a);
-      a.click();
-      window.URL.revokeObjectURL(url);
-      document.body.removeChild(a);
-      toast.success('Video downloaded successfully');
-    } catch (err) {
-      console.error('Error downloading video:', err);
-      toast.error('Error downloading video');
-    }
+  const handleDownload = () => {
+    const a = document.createElement('a');
+    a.href = api.getVideoUrl(taskId, true);
+    a.download = `video_${taskId}.mp4`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
   };
 
   return (
@@ -154,6 +145,7 @@ function App() {
                 currentStep={currentStep}
                 progress={progress}
                 onDownload={handleDownload}
+                videoUrl={status === 'completed' ? api.getVideoUrl(taskId) : null}
               />
             )}
             <ToastContainer 
@@ -38,16 +38,28 @@ export const checkStatus = async (taskId) => {
   }
 };
 
-export const downloadVideo = async (taskId) => {
-  try {
-    const response = await api.get(`/video/${taskId}`, {
-      responseType: 'blob',
+// Subscribes to the task's Server-Sent Events stream. Returns a function that closes it.
+export const watchStatus = (taskId, onStatus, onError) => {
+  const source = new EventSource(`${API_BASE_URL}/events/${taskId}`);
+  source.addEventListener('status', (event) => {
+    const data = JSON.parse(event.data);
+    onStatus({
+      status: data.status,
+      current_step: data.current_step,
+      progress: data.progress,
+      error: data.error
     });
-    return response.data;
-  } catch (error) {
-    if (error.response) {
-      throw new Error(error.response.data.detail || 'Error downloading video');
+  });
+  source.onerror = () => {
+    // The browser reconnects on its own unless the stream was closed for good
+    if (source.readyState === EventSource.CLOSED) {
+      onError(new Error('Lost connection while watching video status'));
     }
-    throw new Error('Network error occurred');
-  }
+  };
+  return () => source.close();
 };
+
+// The video is streamed by the browser (the API answers byte-range requests), so
+// players and downloads use its URL instead of fetching the whole file first.
+export const getVideoUrl = (taskId, download = false) =>
+  `${API_BASE_URL}/video/${taskId}${download ? '?download=true' : ''}`;
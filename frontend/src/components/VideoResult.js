@@ -20,20 +20,23 @@ const StatusBox = styled(Box)(({ theme }) => ({
   marginBottom: theme.spacing(2),
 }));
 
-const VideoResult = ({ taskId, status, error, onDownload, currentStep, progress }) => {
+const VideoResult = ({ taskId, status, error, onDownload, currentStep, progress, videoUrl }) => {
   const isCompleted = status === 'completed';
   const isFailed = status === 'failed';
   const isProcessing = status === 'processing';
+  const isCancelled = status === 'cancelled';
 
   const getStatusColor = () => {
     if (isCompleted) return 'success.main';
     if (isFailed) return 'error.main';
+    if (isCancelled) return 'text.secondary';
     return 'primary.main';
   };
 
   const getStatusMessage = () => {
     if (isCompleted) return 'Video generation completed!';
     if (isFailed) return 'Video generation failed';
+    if (isCancelled) return 'Video generation cancelled';
     if (isProcessing) return currentStep || 'Processing...';
     return 'Starting video generation...';
   };
@@ -58,7 +61,7 @@ const VideoResult = ({ taskId, status, error, onDownload, currentStep, progress
           </Box>
         )}
 
-        {!isCompleted && !isFailed && (
+        {!isCompleted && !isFailed && !isCancelled && (
           <Box display="flex" alignItems="center" gap={1} sx={{ mt: 2 }}>
             <CircularProgress size={20} />
             <Typography variant="body2" color="text.secondary">
@@ -74,6 +77,16 @@ const VideoResult = ({ taskId, status, error, onDownload, currentStep, progress
         )}
       </StatusBox>
 
+      {isCompleted && videoUrl && (
+        <Box
+          component="video"
+          src={videoUrl}
+          controls
+          preload="metadata"
+          sx={{ width: '100%', mb: 2, borderRadius: 1 }}
+        />
+      )}
+
       {isCompleted && (
         <Button
           variant="contained"
@@ -0,0 +1,67 @@
+"""
+Standalone job worker.
+
+Pulls video jobs queued by the API and renders them. Run as many workers as
+the machine can handle; the API and the workers must share the job queue and
+the task store:
+
+    TASK_STORE=sqlite:///output/tasks.db python worker.py --concurrency 2
+"""
+import signal
+import asyncio
+import logging
+import argparse
+from core.clients import close_clients
+from core.job_queue import JobQueue
+from core.render import render_pool
+from core.task_store import create_task_store, InMemoryTaskStore
+from core.worker import Worker, WORKER_CONCURRENCY, WORKER_SHUTDOWN_TIMEOUT
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main(concurrency, worker_id=None):
+    tasks = create_task_store()
+    if isinstance(tasks, InMemoryTaskStore):
+        logger.warning("TASK_STORE is 'memory': task status will not be visible to the API")
+
+    worker = Worker(JobQueue(), tasks, concurrency=concurrency, worker_id=worker_id)
+
+    # First signal drains the worker: no new jobs, running jobs finish. A second
+    # signal, or running jobs outlasting WORKER_SHUTDOWN_TIMEOUT, interrupts them
+    # and puts them back in the queue
+    loop = asyncio.get_running_loop()
+    stopping = False
+
+    def abort():
+        logger.warning("Interrupting running jobs and requeuing them")
+        worker.abort()
+
+    def on_signal():
+        nonlocal stopping
+        if stopping:
+            abort()
+            return
+        stopping = True
+        logger.info(f"Stopping: waiting up to {WORKER_SHUTDOWN_TIMEOUT:.0f}s for running jobs (signal again to interrupt them)")
+        worker.stop()
+        loop.call_later(WORKER_SHUTDOWN_TIMEOUT, abort)
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, on_signal)
+
+    try:
+        await worker.run()
+    finally:
+        render_pool.shutdown()
+        await close_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a MAVEN video job worker")
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY,
+                        help=f"Jobs run at the same time (default: {WORKER_CONCURRENCY})")
+    parser.add_argument('--worker-id', default=None,
+                        help="Stable worker id; on restart, jobs interrupted under this id are requeued")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.worker_id))